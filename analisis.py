@@ -0,0 +1,243 @@
+# MIT License
+# Copyright (c) 2024 Raúl Martín-Romo Sánchez
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+# Análisis por lotes de las sesiones registradas (ver sesiones.py).
+# Recorre carpetas de sesiones con generadores, reproduce cada partida con el motor en un grupo de
+# procesos y va escribiendo los resultados por columnas, sin cargar nunca todas las sesiones a la vez.
+#
+# Uso: python analisis.py sesiones/ otra_carpeta/ --salida analisis --procesos 8
+
+import argparse
+import concurrent.futures
+import json
+import os
+import numpy as np
+
+import motor
+import sesiones
+from motor import DIFFICULTY_SETTINGS
+
+# Columnas de la salida, con su tipo; cada sesión es una fila
+COLUMNS = [
+    ('inicio', '<i8'),        # epoch (s) en que empezó la partida
+    ('dificultad', 'u1'),     # índice en DIFFICULTY_NAMES
+    ('ganada', 'u1'),
+    ('movimientos', '<u4'),
+    ('pistas', '<u4'),
+    ('parejas', '<u2'),       # parejas descubiertas
+    ('total_parejas', '<u2'),
+    ('duracion_ms', '<u4'),
+    ('ms_por_pareja', '<f4'),  # tiempo medio hasta cada pareja descubierta (NaN si no hay ninguna)
+]
+DIFFICULTY_NAMES = list(DIFFICULTY_SETTINGS) + ['Otra']
+DIFFICULTY_CODES = {size: code for code, size in enumerate(DIFFICULTY_SETTINGS.values())}
+
+# Función para recorrer las carpetas (y subcarpetas) y devolver las sesiones una a una
+def iter_session_paths(folders):
+    pending = list(folders)
+    while pending:
+        folder = pending.pop()
+        with os.scandir(folder) as entries:
+            for entry in entries:
+                if entry.is_dir():
+                    pending.append(entry.path)
+                elif entry.name.endswith(sesiones.SESSION_EXTENSION):
+                    yield entry.path
+
+# Función para agrupar un iterable en listas de como mucho `size` elementos
+def batched(iterable, size):
+    batch = []
+    for item in iterable:
+        batch.append(item)
+        if len(batch) == size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+# Función para reproducir una sesión y resumirla en una fila; None si el fichero no es válido
+def analyze_session(path):
+    try:
+        with sesiones.Sesion(path) as session:
+            engine = sesiones.initial_engine(session)
+            match_times = [event_time for event_time, _, events in sesiones.replay_steps(session, engine)
+                           if any(event[0] == motor.MATCH for event in events)]
+            duration = session.duration()
+            started = session.started
+            rows, cols = session.rows, session.cols
+    except (ValueError, KeyError, OSError, IndexError):
+        return None
+
+    # Las parejas que ya estaban descubiertas al empezar no cuentan para el tiempo por pareja
+    ms_per_pair = match_times[-1] / len(match_times) if match_times else float('nan')
+    return (started, DIFFICULTY_CODES.get((rows, cols), len(DIFFICULTY_NAMES) - 1), engine.is_won(),
+            engine.moves, engine.hints, engine.pairs_found, engine.num_pairs, duration, ms_per_pair)
+
+def analyze_batch(paths):
+    return [(path, analyze_session(path)) for path in paths]
+
+# Función para analizar las sesiones en paralelo; devuelve (ruta, fila) a medida que terminan.
+# Solo hay `max_pending` lotes en vuelo a la vez, así que la memoria no depende del número de sesiones
+def analyze_parallel(paths, workers=None, batch_size=256, max_pending=None):
+    batches = batched(paths, batch_size)
+    if workers == 1:
+        for batch in batches:
+            yield from analyze_batch(batch)
+        return
+
+    workers = workers or os.cpu_count() or 1
+    max_pending = max_pending or 2 * workers
+    with concurrent.futures.ProcessPoolExecutor(workers) as executor:
+        in_flight = set()
+        for batch in batches:
+            in_flight.add(executor.submit(analyze_batch, batch))
+            if len(in_flight) >= max_pending:
+                done, in_flight = concurrent.futures.wait(in_flight, return_when=concurrent.futures.FIRST_COMPLETED)
+                for future in done:
+                    yield from future.result()
+        for future in concurrent.futures.as_completed(in_flight):
+            yield from future.result()
+
+class Columnas:
+    # Escritor de la salida por columnas: un fichero binario por columna al que se añade cada bloque,
+    # las rutas en un fichero de texto y la descripción de las columnas en columnas.json
+    def __init__(self, folder, block_size=4096):
+        os.makedirs(folder, exist_ok=True)
+        self.folder = folder
+        self.block_size = block_size
+        self.files = {name: open(os.path.join(folder, name + '.bin'), 'wb') for name, _ in COLUMNS}
+        self.paths_file = open(os.path.join(folder, 'rutas.txt'), 'w', encoding='utf-8')
+        self.rows = []
+        self.count = 0
+
+    def add(self, path, row):
+        self.paths_file.write(path + '\n')
+        self.rows.append(row)
+        if len(self.rows) >= self.block_size:
+            self.flush()
+
+    def flush(self):
+        if not self.rows:
+            return
+        block = np.array(self.rows, dtype=COLUMNS)
+        for name, _ in COLUMNS:
+            self.files[name].write(block[name].tobytes())
+        self.count += len(self.rows)
+        self.rows = []
+
+    def close(self):
+        self.flush()
+        for column_file in self.files.values():
+            column_file.close()
+        self.paths_file.close()
+        with open(os.path.join(self.folder, 'columnas.json'), 'w') as schema_file:
+            json.dump({'filas': self.count, 'columnas': dict(COLUMNS), 'dificultades': DIFFICULTY_NAMES},
+                      schema_file, indent=2)
+
+# Función para leer la salida de Columnas como un diccionario de arrays (con mmap)
+def load_columns(folder):
+    with open(os.path.join(folder, 'columnas.json')) as schema_file:
+        schema = json.load(schema_file)
+    return {name: np.memmap(os.path.join(folder, name + '.bin'), dtype, mode='r', shape=(schema['filas'],))
+            if schema['filas'] else np.zeros(0, dtype)
+            for name, dtype in schema['columnas'].items()}
+
+class Resumen:
+    # Acumuladores por dificultad: solo sumas y contadores, así que ocupa lo mismo con mil o un millón de sesiones
+    def __init__(self):
+        self.stats = {}
+
+    def add(self, row):
+        started, difficulty, won, moves, hints, pairs, total_pairs, duration, ms_per_pair = row
+        stats = self.stats.setdefault(DIFFICULTY_NAMES[difficulty], {
+            'partidas': 0, 'ganadas': 0, 'movimientos_ganadas': 0, 'pistas': 0, 'partidas_con_pistas': 0,
+            'parejas': 0, 'ms_parejas': 0.0, 'abandonadas': 0, 'progreso_abandonadas': 0.0})
+        stats['partidas'] += 1
+        stats['pistas'] += hints
+        stats['partidas_con_pistas'] += hints > 0
+        if pairs:
+            stats['parejas'] += pairs
+            stats['ms_parejas'] += ms_per_pair * pairs
+        if won:
+            stats['ganadas'] += 1
+            stats['movimientos_ganadas'] += moves
+        else:
+            stats['abandonadas'] += 1
+            stats['progreso_abandonadas'] += pairs / total_pairs
+
+    # Función para calcular las medias finales de cada dificultad
+    def result(self):
+        result = {}
+        for name in DIFFICULTY_NAMES:
+            stats = self.stats.get(name)
+            if stats is None:
+                continue
+            games, wins, abandoned = stats['partidas'], stats['ganadas'], stats['abandonadas']
+            result[name] = {
+                'partidas': games,
+                'ganadas': wins,
+                'abandono': abandoned / games,
+                'movimientos_para_ganar': stats['movimientos_ganadas'] / wins if wins else None,
+                'pistas_por_partida': stats['pistas'] / games,
+                'partidas_con_pistas': stats['partidas_con_pistas'] / games,
+                'ms_por_pareja': stats['ms_parejas'] / stats['parejas'] if stats['parejas'] else None,
+                'progreso_al_abandonar': stats['progreso_abandonadas'] / abandoned if abandoned else None,
+            }
+        return result
+
+def main():
+    parser = argparse.ArgumentParser(description='Análisis por lotes de sesiones de Emparejados')
+    parser.add_argument('carpetas', nargs='+', help='carpetas con sesiones (se recorren las subcarpetas)')
+    parser.add_argument('--salida', default='analisis', help='carpeta de salida por columnas')
+    parser.add_argument('--procesos', type=int, default=None, help='procesos de trabajo (por defecto, uno por núcleo)')
+    parser.add_argument('--lote', type=int, default=256, help='sesiones por tarea')
+    parser.add_argument('--pendientes', type=int, default=None, help='lotes en vuelo como máximo')
+    args = parser.parse_args()
+
+    columns = Columnas(args.salida)
+    summary = Resumen()
+    errors = 0
+    try:
+        for path, row in analyze_parallel(iter_session_paths(args.carpetas), args.procesos, args.lote,
+                                          args.pendientes):
+            if row is None:
+                errors += 1
+                continue
+            columns.add(path, row)
+            summary.add(row)
+    finally:
+        columns.close()
+
+    result = summary.result()
+    with open(os.path.join(args.salida, 'resumen.json'), 'w') as summary_file:
+        json.dump({'sesiones': columns.count, 'errores': errors, 'dificultades': result}, summary_file, indent=2)
+
+    print(f"{columns.count} sesiones analizadas ({errors} con errores), resultados en {args.salida}")
+    for name, stats in result.items():
+        moves = stats['movimientos_para_ganar']
+        pair_ms = stats['ms_por_pareja']
+        print(f"{name:<8} partidas {stats['partidas']:>7}  abandono {stats['abandono']:6.1%}  "
+              f"movimientos {'-' if moves is None else f'{moves:7.1f}'}  "
+              f"pistas/partida {stats['pistas_por_partida']:5.2f}  "
+              f"ms/pareja {'-' if pair_ms is None else f'{pair_ms:8.0f}'}")
+
+if __name__ == "__main__":
+    main()
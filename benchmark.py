@@ -0,0 +1,194 @@
+# MIT License
+# Copyright (c) 2024 Raúl Martín-Romo Sánchez
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+# Pruebas de rendimiento reproducibles de las rutas reales del juego, sin abrir ninguna ventana.
+# Los resultados se guardan en JSON y se pueden comparar con una ejecución anterior para
+# detectar regresiones.
+#
+# Uso: python benchmark.py --salida resultados.json --base base.json --tolerancia 0.2
+
+import argparse
+import json
+import os
+import platform
+import random
+import statistics
+import sys
+import time
+
+import cv2
+import numpy as np
+
+import emparejados
+import motor
+import paquetes
+from emparejados import (Animaciones, Botones, Capas, Disposicion, Menu, Recursos, Tablero, CARD_IMAGE_FOLDER,
+                         CARD_BACK_PATH, DIFFICULTY_SETTINGS, FULL_SCREEN_WIDTH, FULL_SCREEN_HEIGHT)
+
+SEED = 1234
+
+# Función para medir una función: devuelve mediana y mínimo (ms) de `repeat` ejecuciones
+# setup() se ejecuta antes de cada medición sin contar en el tiempo
+def measure(fn, repeat, setup=None):
+    times = []
+    for _ in range(repeat):
+        if setup is not None:
+            setup()
+        start = time.perf_counter()
+        fn()
+        times.append((time.perf_counter() - start) * 1000)
+    return {'mediana_ms': statistics.median(times), 'minimo_ms': min(times), 'repeticiones': repeat}
+
+# Función para preparar la disposición de una dificultad a 1920x1080
+def use_difficulty(difficulty):
+    rows, cols = DIFFICULTY_SETTINGS[difficulty]
+    Disposicion(FULL_SCREEN_WIDTH, FULL_SCREEN_HEIGHT, rows, cols).activate()
+
+def bench_load_images(results, repeat):
+    use_difficulty('Experto')
+    pack = Tablero.load_pack(CARD_IMAGE_FOLDER)
+    size = (emparejados.CARD_WIDTH, emparejados.CARD_HEIGHT)
+    selection = random.Random(SEED).sample(range(len(pack)), min(len(pack), 30))
+
+    # Abrir el paquete solo lee el índice; después se decodifican las caras de un tablero Experto
+    results['load_images/abrir_paquete'] = measure(lambda: paquetes.PaqueteCartas(CARD_IMAGE_FOLDER), repeat)
+    results['load_images/frio'] = measure(lambda: pack.faces(selection, size), repeat,
+                                          setup=paquetes.face_cache.clear)
+    pack.faces(selection, size)
+    results['load_images/cache'] = measure(lambda: pack.faces(selection, size), repeat)
+
+def bench_board(results, repeat):
+    for difficulty in DIFFICULTY_SETTINGS:
+        use_difficulty(difficulty)
+        pack = Tablero.load_pack(CARD_IMAGE_FOLDER)
+        back_image = Recursos.get_image(CARD_BACK_PATH, (emparejados.CARD_WIDTH, emparejados.CARD_HEIGHT))
+
+        random.seed(SEED)
+        results[f'create_board/{difficulty}'] = measure(
+            lambda: Tablero.create_board(emparejados.ROWS, emparejados.COLS, pack), repeat)
+
+        # La mitad de las cartas boca arriba para dibujar caras y reversos
+        random.seed(SEED)
+        board, atlas = Tablero.create_board(emparejados.ROWS, emparejados.COLS, pack)
+        flipped = np.random.default_rng(SEED).random(board.shape) < 0.5
+        screen = np.zeros((FULL_SCREEN_HEIGHT, FULL_SCREEN_WIDTH, 3), dtype=np.uint8)
+        results[f'draw_board/{difficulty}'] = measure(
+            lambda: Tablero.draw_board(board, flipped, atlas, screen, back_image), repeat)
+
+        engine = motor.Motor(emparejados.ROWS, emparejados.COLS, seed=SEED, board=board)
+        results[f'find_unmatched_pair/{difficulty}'] = measure(
+            lambda: Botones.find_unmatched_pair(engine.pair_index), repeat)
+
+def bench_flip(results, repeat):
+    use_difficulty('Medio')
+    pack = Tablero.load_pack(CARD_IMAGE_FOLDER)
+    face = pack.face(0, (emparejados.CARD_WIDTH, emparejados.CARD_HEIGHT))
+    back_image = Recursos.get_image(CARD_BACK_PATH, (emparejados.CARD_WIDTH, emparejados.CARD_HEIGHT))
+    screen = np.zeros((FULL_SCREEN_HEIGHT, FULL_SCREEN_WIDTH, 3), dtype=np.uint8)
+    duration = Animaciones.flip_duration()
+    frame_delay = max(1, int(1000 / emparejados.FLIP_FPS))
+
+    # Dibuja todos los fotogramas de un giro, como lo haría el bucle del juego
+    def flip():
+        draw = Animaciones.flip_card(face, 100, 100, back_image)
+        for elapsed in range(0, duration, frame_delay):
+            draw(screen, elapsed)
+
+    results['flip_card/hojas_frias'] = measure(flip, repeat, setup=Animaciones._flip_sheets.clear)
+    results['flip_card/hojas_cache'] = measure(flip, repeat)
+
+def bench_menu(results, repeat):
+    Disposicion(FULL_SCREEN_WIDTH, FULL_SCREEN_HEIGHT).activate()
+    Menu.draw_difficulty_menu()
+    # Sin las capas en caché (primer dibujo tras cambiar de tamaño), con ellas y con un botón resaltado
+    results['draw_difficulty_menu/capas_frias'] = measure(Menu.draw_difficulty_menu, repeat,
+                                                          setup=Capas._cache.clear)
+    Menu.draw_difficulty_menu()
+    results['draw_difficulty_menu'] = measure(Menu.draw_difficulty_menu, repeat)
+    results['draw_difficulty_menu/resaltado'] = measure(lambda: Menu.draw_difficulty_menu('Medio'), repeat)
+
+BENCHMARKS = {
+    'load_images': bench_load_images,
+    'tablero': bench_board,
+    'flip_card': bench_flip,
+    'menu': bench_menu,
+}
+
+# Función para comparar con una ejecución base; devuelve las pruebas más lentas que la tolerancia
+# Las diferencias por debajo de min_ms se ignoran, son ruido en pruebas tan cortas
+def compare(results, baseline, tolerance, min_ms=0.05):
+    regressions = []
+    for name, result in results.items():
+        base = baseline.get(name)
+        if base is None:
+            continue
+        ratio = result['mediana_ms'] / max(base['mediana_ms'], 1e-6)
+        if ratio > 1 + tolerance and result['mediana_ms'] - base['mediana_ms'] > min_ms:
+            regressions.append((name, base['mediana_ms'], result['mediana_ms'], ratio))
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description='Pruebas de rendimiento de Emparejados')
+    parser.add_argument('--salida', default='benchmark_resultados.json', help='fichero JSON de resultados')
+    parser.add_argument('--base', help='resultados anteriores con los que comparar')
+    parser.add_argument('--tolerancia', type=float, default=0.2,
+                        help='aumento relativo de la mediana a partir del cual se considera regresión')
+    parser.add_argument('--minimo-ms', type=float, default=0.05,
+                        help='diferencia absoluta mínima (ms) para considerar regresión')
+    parser.add_argument('--repeticiones', type=int, default=20)
+    parser.add_argument('--solo', nargs='+', choices=list(BENCHMARKS), default=list(BENCHMARKS))
+    args = parser.parse_args()
+
+    # Las rutas de los recursos del juego son relativas a su carpeta; las de la línea de órdenes,
+    # a la carpeta desde la que se ejecuta, así que se resuelven antes de cambiar de carpeta
+    args.salida = os.path.abspath(args.salida)
+    if args.base:
+        args.base = os.path.abspath(args.base)
+    os.chdir(os.path.dirname(os.path.abspath(__file__)))
+
+    results = {}
+    for name in args.solo:
+        BENCHMARKS[name](results, args.repeticiones)
+
+    output = {
+        'entorno': {'python': sys.version.split()[0], 'numpy': np.__version__, 'opencv': cv2.__version__,
+                    'plataforma': platform.platform(), 'semilla': SEED},
+        'resultados': results,
+    }
+    with open(args.salida, 'w') as output_file:
+        json.dump(output, output_file, indent=2)
+
+    for name, result in results.items():
+        print(f"{name:<32} {result['mediana_ms']:>10.3f} ms  (min {result['minimo_ms']:.3f})")
+    print(f"Resultados guardados en {args.salida}")
+
+    if args.base:
+        with open(args.base) as baseline_file:
+            baseline = json.load(baseline_file)['resultados']
+        regressions = compare(results, baseline, args.tolerancia, args.minimo_ms)
+        for name, before, after, ratio in regressions:
+            print(f"REGRESION {name}: {before:.3f} ms -> {after:.3f} ms (x{ratio:.2f})")
+        if regressions:
+            sys.exit(1)
+        print("Sin regresiones respecto a la base")
+
+if __name__ == "__main__":
+    main()
@@ -23,18 +23,26 @@ import cv2
 import numpy as np
 import random
 import os
+import threading
+import time
+import json
+import contextlib
+from collections import deque
 
-# Dimensiones del tablero y las cartas
-CARD_WIDTH, CARD_HEIGHT = 100, 150
-CARD_SPACING = 20  # Espacio entre las cartas
+import jugadores
+import motor
+import paquetes
+import sesiones
+from motor import Motor, DIFFICULTY_SETTINGS
 
-# Dimensiones del tablero por dificultad
-DIFFICULTY_SETTINGS = {
-    'Facil': (3, 2),   # 3x2
-    'Medio': (4, 4),   # 4x4
-    'Dificil': (4, 8), # 6x6
-    'Experto': (5, 12)  # 8x8
-}
+# Dimensiones máximas de las cartas; en tableros grandes se reducen para que quepan en pantalla
+DEFAULT_CARD_WIDTH, DEFAULT_CARD_HEIGHT = 100, 150
+DEFAULT_CARD_SPACING = 20
+MIN_CARD_SPACING = 4
+
+# Dimensiones de las cartas de la partida en curso
+CARD_WIDTH, CARD_HEIGHT = DEFAULT_CARD_WIDTH, DEFAULT_CARD_HEIGHT
+CARD_SPACING = DEFAULT_CARD_SPACING  # Espacio entre las cartas
 
 # Variables globales de la dificultad seleccionada
 selected_difficulty = None
@@ -48,7 +56,17 @@ BLUE = (255, 0, 0)
 RED = (0, 0, 255)
 ORANGE = (0, 164, 250)
 
-# Dimensiones predeterminadas para pantalla completa
+# Colores de los botones con el ratón encima
+HOVER_BLUE = (255, 110, 60)
+HOVER_RED = (90, 90, 255)
+HOVER_ORANGE = (60, 200, 255)
+
+# Colores de los botones mientras se mantienen pulsados
+PRESSED_BLUE = (170, 0, 0)
+PRESSED_RED = (0, 0, 170)
+PRESSED_ORANGE = (0, 110, 170)
+
+# Dimensiones de diseño; la disposición real se escala al tamaño de la ventana
 FULL_SCREEN_WIDTH = 1920
 FULL_SCREEN_HEIGHT = 1080
 
@@ -56,6 +74,9 @@ FULL_SCREEN_HEIGHT = 1080
 BOARD_WIDTH = COLS * (CARD_WIDTH + CARD_SPACING) - CARD_SPACING
 BOARD_HEIGHT = ROWS * (CARD_HEIGHT + CARD_SPACING) - CARD_SPACING
 
+# Disposición activa (ver la clase Disposicion); se crea al final del módulo
+layout = None
+
 # Definir las dimensiones y posición del botón Exit
 EXIT_BUTTON_WIDTH = 150
 EXIT_BUTTON_HEIGHT = 55
@@ -66,6 +87,74 @@ HELP_BUTTON_WIDTH = 150
 HELP_BUTTON_HEIGHT = 55
 HELP_BUTTON_MARGIN = 30
 
+# Qué pareja señala el botón Help (ver las estrategias de motor.IndiceParejas)
+HELP_HINT_STRATEGY = motor.HINT_ANY
+
+# Animación de giro: fotogramas por cada mitad del giro y velocidad de reproducción
+FLIP_STEPS = 10
+FLIP_FPS = 66
+FLIP_HOLD_MS = 120
+
+# Memoria máxima de las hojas de animación de giro guardadas (cada una ocupa unas 5 veces su imagen)
+FLIP_SHEET_CACHE_BYTES = 64 * 1024 * 1024
+
+# Duración (ms) de las marcas de acierto/fallo, de la pausa antes de ocultar y del resaltado de ayuda
+MARK_DURATION_MS = 500
+MISMATCH_DELAY_MS = 1000
+HINT_DURATION_MS = 1500
+
+# Espera de cv2.waitKey en cada tick del bucle, con y sin animaciones en curso
+ANIMATION_TICK_MS = 15
+IDLE_TICK_MS = 30
+
+# El hilo de render compone como mucho RENDER_FPS fotogramas por segundo; la cola tiene dos buffers
+# de ida y vuelta más el que se está mostrando
+RENDER_FPS = 60
+FRAME_BUFFERS = 3
+
+# Rutas de las imágenes del juego
+CARD_IMAGE_FOLDER = './imagenes/cartas'
+CARD_BACK_PATH = './imagenes/CartaAtras.png'
+MENU_BACKGROUND_PATH = './imagenes/FondoMenu.jpg'
+BOARD_BACKGROUND_PATH = './imagenes/FondoTablero.jpg'
+VICTORY_IMAGE_PATH = './imagenes/Eliberio_fiesta.png'
+
+# Paquete de cartas (ver paquetes.py): por defecto la carpeta de cartas; EMPAREJADOS_PAQUETE puede
+# apuntar a otra carpeta o a un .zip
+CARD_PACK_ENV = 'EMPAREJADOS_PAQUETE'
+CARD_PACK_PATH = os.environ.get(CARD_PACK_ENV, CARD_IMAGE_FOLDER)
+
+# Carpeta donde se registra cada partida para poder continuarla o reproducirla (ver sesiones.py)
+SESSION_FOLDER = './sesiones'
+
+# Perfilado: se activa con EMPAREJADOS_PERFIL=1 (o la tecla P durante la partida) y la traza
+# en formato Chrome trace se guarda al salir de cada partida en EMPAREJADOS_TRAZA
+PROFILE_ENV = 'EMPAREJADOS_PERFIL'
+TRACE_PATH_ENV = 'EMPAREJADOS_TRAZA'
+DEFAULT_TRACE_PATH = './emparejados_traza.json'
+MAX_TRACE_EVENTS = 200000
+MAX_FRAME_SAMPLES = 10000
+FRAME_HISTOGRAM_EDGES_MS = (0, 8, 16, 25, 33, 50, 100, 250, float('inf'))
+OVERLAY_REFRESH_MS = 500
+
+# Lado (en píxeles) de las celdas del índice espacial de regiones clicables
+HIT_CELL_SIZE = 64
+
+# Margen alrededor de cada carta que se repinta junto a ella (cubre el borde del resaltado de ayuda)
+CARD_DIRTY_MARGIN = 6
+
+# Eventos del ratón que caben en la cola de entrada entre dos ticks; si se llena se pierden los más antiguos
+INPUT_QUEUE_SIZE = 1024
+
+# Dos pulsaciones en el mismo punto separadas por menos de este tiempo cuentan como una (rebote, pantallas táctiles)
+CLICK_DEBOUNCE_MS = 40
+CLICK_DEBOUNCE_PX = 4
+
+# Tipos de evento de la cola de entrada
+INPUT_MOVE = 'mover'
+INPUT_DOWN = 'pulsar'
+INPUT_UP = 'soltar'
+
 def draw_rounded_rectangle(img, top_left, bottom_right, color, radius=20):
     # Dibuja el rectángulo con esquinas redondeadas
     x1, y1 = top_left
@@ -81,436 +170,1346 @@ def draw_rounded_rectangle(img, top_left, bottom_right, color, radius=20):
     cv2.ellipse(img, (x1 + radius, y2 - radius), (radius, radius), 90, 0, 90, color, -1)   # Esquina inferior izquierda
     cv2.ellipse(img, (x2 - radius, y2 - radius), (radius, radius), 0, 0, 90, color, -1)
 
+class Capas:
+    # Capas estáticas (fondo con los elementos fijos) y sprites con máscara (botones en cada estado,
+    # marcas de acierto y fallo) ya dibujados para la disposición activa. Se dibujan una vez y después
+    # solo se copian; la caché se vacía cuando cambia el tamaño de la ventana.
+    _cache = {}
+    _layout_size = None
+
+    # Función para obtener un elemento de la caché o dibujarlo con render_fn si aún no existe
+    def cached(key, render_fn):
+        if Capas._layout_size != layout.size:
+            Capas._cache = {}
+            Capas._layout_size = layout.size
+        entry = Capas._cache.get(key)
+        if entry is None:
+            entry = Capas._cache[key] = render_fn()
+        return entry
+
+    # Función para crear un sprite: draw_fn(lienzo, color) dibuja la forma; devuelve (imagen, máscara)
+    def make_sprite(width, height, draw_fn):
+        image = np.zeros((height, width, 3), dtype=np.uint8)
+        mask = np.zeros((height, width), dtype=np.uint8)
+        draw_fn(image, None)
+        draw_fn(mask, 255)
+        image.flags.writeable = False
+        mask = mask.astype(bool)[..., None]
+        mask.flags.writeable = False
+        return image, mask
+
+    # Función para copiar un sprite sobre la pantalla en (x, y), recortándolo a los bordes
+    def blit(screen, sprite, x, y):
+        image, mask = sprite
+        height, width = mask.shape[:2]
+        x1, y1 = max(0, x), max(0, y)
+        x2, y2 = min(screen.shape[1], x + width), min(screen.shape[0], y + height)
+        if x1 >= x2 or y1 >= y2:
+            return
+        np.copyto(screen[y1:y2, x1:x2], image[y1 - y:y2 - y, x1 - x:x2 - x], where=mask[y1 - y:y2 - y, x1 - x:x2 - x])
+
+    # Función para obtener el sprite de un botón con su texto
+    # text_offset es la posición del texto dentro del botón, o None para centrarlo
+    def button_sprite(width, height, text, color, text_offset=None):
+        def draw(canvas, mask_color):
+            draw_rounded_rectangle(canvas, (0, 0), (width, height), mask_color or color, radius=layout.button_radius)
+            if text_offset is None:
+                text_size = cv2.getTextSize(text, cv2.FONT_HERSHEY_SIMPLEX, layout.font_scale, layout.font_thickness)[0]
+                position = ((width - text_size[0]) // 2, (height + text_size[1]) // 2)
+            else:
+                position = text_offset
+            cv2.putText(canvas, text, position, cv2.FONT_HERSHEY_SIMPLEX, layout.font_scale,
+                        mask_color or WHITE, layout.font_thickness)
+
+        return Capas.cached(('boton', width, height, text, color, text_offset),
+                            lambda: Capas.make_sprite(width + 1, height + 1, draw))
+
+class Recursos:
+    # Caché de imágenes compartida por todo el proceso: (ruta, tamaño) -> (mtime, imagen)
+    _cache = {}
+    _lock = threading.Lock()
+    _key_locks = {}
+
+    # Función para obtener una imagen decodificada (y redimensionada si se indica tamaño)
+    # Solo se vuelve a leer del disco si el fichero ha cambiado desde la última carga
+    def get_image(path, size=None):
+        try:
+            mtime = os.path.getmtime(path)
+        except OSError:
+            return None
+
+        key = (os.path.abspath(path), size)
+        with Recursos._lock:
+            key_lock = Recursos._key_locks.setdefault(key, threading.Lock())
+
+        with key_lock:
+            entry = Recursos._cache.get(key)
+            if entry is not None and entry[0] == mtime:
+                return entry[1]
+
+            if size is None:
+                img = cv2.imread(path)
+            else:
+                img = Recursos.get_image(path)
+                if img is not None:
+                    img = cv2.resize(img, size)
+            if img is not None:
+                # Las imágenes se comparten entre pantallas, así que nadie debe modificarlas
+                img.flags.writeable = False
+
+            Recursos._cache[key] = (mtime, img)
+            return img
+
+    # Función para vaciar la caché (por ejemplo para medir cargas en frío)
+    def clear():
+        with Recursos._lock:
+            Recursos._cache.clear()
+            Recursos._key_locks.clear()
+
+    # Función para precargar imágenes en un hilo en segundo plano
+    def preload(jobs):
+        def worker():
+            for path, size in jobs:
+                Recursos.get_image(path, size)
+
+        thread = threading.Thread(target=worker, name='precarga-recursos', daemon=True)
+        thread.start()
+        return thread
+
+    # Lista de imágenes que usa el juego para una disposición, en el orden en que se necesitan
+    # El reverso se prepara al tamaño que tendrá en cada dificultad; las caras las decodifica el
+    # paquete de cartas al crear cada tablero, solo las que salen en él
+    def startup_jobs(screen_layout):
+        jobs = [(MENU_BACKGROUND_PATH, screen_layout.size),
+                (BOARD_BACKGROUND_PATH, screen_layout.size)]
+        card_sizes = []
+        for rows, cols in DIFFICULTY_SETTINGS.values():
+            card_width, card_height, _ = Tablero.fit_card_size(rows, cols, *screen_layout.size, screen_layout.scale)
+            if (card_width, card_height) not in card_sizes:
+                card_sizes.append((card_width, card_height))
+
+        for card_size in card_sizes:
+            jobs.append((CARD_BACK_PATH, card_size))
+        jobs.append((VICTORY_IMAGE_PATH, None))
+        return jobs
+
+class RegistroClics:
+    # Índice espacial de las regiones clicables de una pantalla: la ventana se divide en celdas
+    # de HIT_CELL_SIZE píxeles y cada celda guarda las pocas regiones que la tocan, así que
+    # encontrar la región bajo el ratón cuesta lo mismo con 2 botones que con 200 cartas
+    def __init__(self, cell_size=HIT_CELL_SIZE):
+        self.cell_size = cell_size
+        self.buckets = {}  # (columna, fila) de la celda -> [(clave, (x, y, w, h), resolve)]
+
+    # Registra una región; resolve(x, y) recibe coordenadas relativas a la región y devuelve un
+    # detalle (por ejemplo la carta) o None si ese punto de la región no es clicable
+    def add(self, key, rect, resolve=None):
+        x, y, w, h = rect
+        entry = (key, rect, resolve)
+        for bucket_y in range(max(0, y) // self.cell_size, max(0, y + h) // self.cell_size + 1):
+            for bucket_x in range(max(0, x) // self.cell_size, max(0, x + w) // self.cell_size + 1):
+                self.buckets.setdefault((bucket_x, bucket_y), []).append(entry)
+
+    # Devuelve (clave, detalle) de la región bajo el punto, o None si no hay ninguna
+    def lookup(self, x, y):
+        if x < 0 or y < 0:
+            return None
+        for key, (region_x, region_y, width, height), resolve in self.buckets.get((x // self.cell_size,
+                                                                                    y // self.cell_size), ()):
+            if region_x <= x <= region_x + width and region_y <= y <= region_y + height:
+                if resolve is None:
+                    return key, None
+                detail = resolve(x - region_x, y - region_y)
+                if detail is not None:
+                    return key, detail
+        return None
+
+class EntradaRaton:
+    # Cola de entrada del ratón: el callback de OpenCV solo sella cada evento con su instante y un
+    # número de secuencia y lo añade a una cola acotada (deque.append es atómico, no hace falta cerrojo).
+    # El bucle del juego la vacía una vez por tick y aplica los eventos en orden de llegada, con los
+    # movimientos seguidos fusionados en el último y las pulsaciones repetidas (rebotes) descartadas.
+    def __init__(self, max_events=INPUT_QUEUE_SIZE):
+        self.events = deque(maxlen=max_events)  # (instante, secuencia, tipo, x, y, botón pulsado)
+        self.sequence = 0
+        self.dropped = 0        # eventos perdidos porque la cola estaba llena
+        self.applied = 0        # secuencia del último evento aplicado al estado
+        self.last_click = None  # (instante, x, y) de la última pulsación aceptada
+        self.pending_latency = deque()  # (secuencia, instante) de las pulsaciones aún no mostradas
+
+    # Callback del ratón para cv2.setMouseCallback
+    def callback(self, event, x, y, flags, param=None):
+        if event == cv2.EVENT_LBUTTONDOWN:
+            kind, pressed = INPUT_DOWN, True
+        elif event == cv2.EVENT_LBUTTONUP:
+            kind, pressed = INPUT_UP, False
+        elif event == cv2.EVENT_MOUSEMOVE:
+            kind, pressed = INPUT_MOVE, bool(flags & cv2.EVENT_FLAG_LBUTTON)
+        else:
+            return
+        if len(self.events) == self.events.maxlen:
+            self.dropped += 1
+        self.sequence += 1
+        self.events.append((time.perf_counter() * 1000, self.sequence, kind, x, y, pressed))
+
+    # Saca los eventos llegados hasta `now` y devuelve los que hay que aplicar en este tick
+    def drain(self, now):
+        batch = []
+        while self.events and self.events[0][0] <= now:
+            event = self.events.popleft()
+            event_time, _, kind, x, y, _ = event
+            if kind == INPUT_MOVE and batch and batch[-1][2] == INPUT_MOVE:
+                batch[-1] = event
+                continue
+            if kind == INPUT_DOWN:
+                if self.is_bounce(event_time, x, y):
+                    continue
+                self.last_click = (event_time, x, y)
+                perfilador.input_delay(event_time, now)
+            batch.append(event)
+        if batch:
+            self.applied = batch[-1][1]
+        return batch
+
+    def is_bounce(self, event_time, x, y):
+        if self.last_click is None:
+            return False
+        last_time, last_x, last_y = self.last_click
+        return (event_time - last_time < CLICK_DEBOUNCE_MS and abs(x - last_x) <= CLICK_DEBOUNCE_PX
+                and abs(y - last_y) <= CLICK_DEBOUNCE_PX)
+
+    # Apunta una pulsación aplicada para medir su latencia hasta que se vea en pantalla
+    def track_click(self, event):
+        self.pending_latency.append((event[1], event[0]))
+
+    # Se ha mostrado en shown_time un fotograma que refleja la entrada hasta la secuencia dada
+    def frame_shown(self, sequence, shown_time):
+        while self.pending_latency and self.pending_latency[0][0] <= sequence:
+            perfilador.latency(self.pending_latency.popleft()[1], shown_time)
+
+class Compositor:
+    # Mantiene un único buffer de pantalla persistente y solo repinta las regiones sucias
+    def __init__(self, background):
+        self.background = background
+        self.frame = background.copy()
+        self.regions = {}  # clave -> ((x, y, w, h), función de dibujo)
+        self.dirty = set()
+        self.needs_present = True
+
+    # Registra una región (carta o botón) con la función que la dibuja sobre el buffer
+    def add_region(self, key, rect, draw_fn):
+        frame_height, frame_width = self.frame.shape[:2]
+        x, y, w, h = rect
+        x1, y1 = max(0, x), max(0, y)
+        x2, y2 = min(frame_width, x + w), min(frame_height, y + h)
+        self.regions[key] = ((x1, y1, x2 - x1, y2 - y1), draw_fn)
+        self.dirty.add(key)
+
+    # Marca una región para que se repinte en el próximo render
+    def mark_dirty(self, key):
+        if key in self.regions:
+            self.dirty.add(key)
+
+    # Restaura el fondo de las regiones sucias y las vuelve a dibujar; devuelve si hubo cambios
+    def render(self):
+        if not self.dirty:
+            return False
+
+        for key in self.dirty:
+            (x, y, w, h), _ = self.regions[key]
+            self.frame[y:y + h, x:x + w] = self.background[y:y + h, x:x + w]
+        for key in self.dirty:
+            _, draw_fn = self.regions[key]
+            draw_fn(self.frame)
+
+        self.dirty.clear()
+        self.needs_present = True
+        return True
+
+class ColaFotogramas:
+    # Buffers de pantalla que pasan del hilo que compone al hilo que los muestra.
+    # Solo se guarda el fotograma listo más reciente: si llega otro antes de mostrarlo, el anterior
+    # se descarta (bajo carga se pierden fotogramas en lugar de acumular retraso).
+    def __init__(self, shape, buffers=FRAME_BUFFERS):
+        self.shape = shape
+        self.lock = threading.Lock()
+        self.free = [np.empty(shape, dtype=np.uint8) for _ in range(buffers)]
+        self.ready = None  # (buffer, secuencia de entrada que ya refleja)
+        self.dropped = 0
+
+    # Devuelve un buffer libre para componer; si no queda ninguno se reutiliza el fotograma listo
+    def acquire(self):
+        with self.lock:
+            if self.free:
+                return self.free.pop()
+            buffer, _ = self.ready
+            self.ready = None
+            self.dropped += 1
+            return buffer
+
+    # Publica un fotograma compuesto
+    def publish(self, buffer, sequence):
+        with self.lock:
+            if self.ready is not None:
+                self.free.append(self.ready[0])
+                self.dropped += 1
+            self.ready = (buffer, sequence)
+
+    # Toma el fotograma más reciente para mostrarlo, o None si no hay ninguno nuevo
+    def take(self):
+        with self.lock:
+            ready, self.ready = self.ready, None
+            return ready
+
+    # Devuelve un buffer ya mostrado
+    def release(self, buffer):
+        with self.lock:
+            self.free.append(buffer)
+
+class HiloRender:
+    # Hilo que compone los fotogramas a ritmo de RENDER_FPS mientras el hilo principal atiende la
+    # entrada y muestra (HighGUI solo funciona bien desde el hilo principal).
+    # compose_fn(now) hace el trabajo de cada fotograma; wake() adelanta el siguiente tras un clic.
+    def __init__(self, compose_fn, fps=RENDER_FPS):
+        self.compose_fn = compose_fn
+        self.frame_interval = 1000 / fps
+        self.wake_event = threading.Event()
+        self.running = True
+        self.error = None
+        self.thread = threading.Thread(target=self.run, name='render', daemon=True)
+        self.thread.start()
+
+    def run(self):
+        try:
+            while self.running:
+                start = time.perf_counter() * 1000
+                self.compose_fn(start)
+                # Esperar al siguiente fotograma (o a que llegue entrada); si el fotograma ha tardado
+                # más que el intervalo, el siguiente empieza ya
+                elapsed = time.perf_counter() * 1000 - start
+                self.wake_event.wait(max(0.0, self.frame_interval - elapsed) / 1000)
+                self.wake_event.clear()
+        except Exception as error:
+            # El error se vuelve a lanzar en el hilo principal
+            self.error = error
+
+    def wake(self):
+        self.wake_event.set()
+
+    def stop(self):
+        self.running = False
+        self.wake_event.set()
+        if self.thread is not threading.current_thread():
+            self.thread.join()
+
+class Perfilador:
+    # Instrumentación opcional del bucle del juego: tiempos por etapa, histograma de tiempos de
+    # fotograma, duración de las animaciones y latencia de los clics. Los eventos se guardan en
+    # una cola acotada y se exportan en formato Chrome trace (chrome://tracing, Perfetto).
+    def __init__(self, enabled=False, max_events=MAX_TRACE_EVENTS):
+        self.enabled = enabled
+        self.show_overlay = enabled
+        self.origin = time.perf_counter() * 1000
+        self.pid = os.getpid()
+        self.events = deque(maxlen=max_events)
+        self.stage_totals = {}  # etapa -> [veces, ms en total]
+        self.frame_times = deque(maxlen=MAX_FRAME_SAMPLES)
+        self.latencies = deque(maxlen=MAX_FRAME_SAMPLES)
+        self.animation_totals = {}  # nombre -> [veces, ms en total]
+        self.last_frame = None
+        self.dropped_frames = 0  # fotogramas compuestos que no llegaron a mostrarse
+        self.input_delays = deque(maxlen=MAX_FRAME_SAMPLES)
+        self.dropped_events = 0  # eventos de entrada perdidos con la cola llena
+        self.overlay_text = ''
+        self.overlay_updated = 0
+
+    # Añade un evento completo ("X") a la traza; los tiempos son ms de time.perf_counter
+    def add_event(self, name, category, start, duration, args=None):
+        event = {'name': name, 'cat': category, 'ph': 'X', 'pid': self.pid, 'tid': threading.get_ident(),
+                 'ts': round((start - self.origin) * 1000), 'dur': round(duration * 1000)}
+        if args:
+            event['args'] = args
+        self.events.append(event)
+
+    @contextlib.contextmanager
+    def _timed_stage(self, name):
+        start = time.perf_counter() * 1000
+        try:
+            yield
+        finally:
+            duration = time.perf_counter() * 1000 - start
+            totals = self.stage_totals.setdefault(name, [0, 0.0])
+            totals[0] += 1
+            totals[1] += duration
+            self.add_event(name, 'etapa', start, duration)
+
+    # Mide una etapa del bucle: `with perfilador.stage('render'): ...`; sin perfilado no cuesta nada
+    def stage(self, name):
+        if not self.enabled:
+            return contextlib.nullcontext()
+        return self._timed_stage(name)
+
+    # Marca el inicio de un fotograma y guarda el tiempo transcurrido desde el anterior
+    def frame(self, now):
+        if self.enabled and self.last_frame is not None:
+            self.frame_times.append(now - self.last_frame)
+        self.last_frame = now
+
+    # Registra una animación terminada con su inicio y duración reales
+    def animation(self, name, start, duration):
+        if not self.enabled:
+            return
+        totals = self.animation_totals.setdefault(name, [0, 0.0])
+        totals[0] += 1
+        totals[1] += duration
+        self.add_event(name, 'animacion', start, duration)
+
+    # Registra la latencia de un clic: desde que llega al callback hasta que se muestra su resultado
+    def latency(self, click_time, shown_time):
+        if not self.enabled:
+            return
+        self.latencies.append(shown_time - click_time)
+        self.add_event('clic', 'entrada', click_time, shown_time - click_time)
+
+    # Registra cuánto esperó un clic en la cola de entrada hasta que el bucle lo aplicó
+    def input_delay(self, click_time, applied_time):
+        if not self.enabled:
+            return
+        self.input_delays.append(applied_time - click_time)
+        self.add_event('cola_entrada', 'entrada', click_time, applied_time - click_time)
+
+    def fps(self):
+        recent = list(self.frame_times)[-30:]
+        return 1000 / (sum(recent) / len(recent)) if recent else 0.0
+
+    # Histograma de tiempos de fotograma: lista de (desde_ms, hasta_ms, fotogramas)
+    def frame_histogram(self):
+        counts, _ = np.histogram(list(self.frame_times), bins=FRAME_HISTOGRAM_EDGES_MS)
+        return [(FRAME_HISTOGRAM_EDGES_MS[i], FRAME_HISTOGRAM_EDGES_MS[i + 1], int(count))
+                for i, count in enumerate(counts)]
+
+    # Actualiza el texto de la superposición cada OVERLAY_REFRESH_MS; devuelve si ha cambiado
+    def update_overlay(self, now):
+        if not self.show_overlay or now - self.overlay_updated < OVERLAY_REFRESH_MS:
+            return False
+        self.overlay_updated = now
+        latency = f"{self.latencies[-1]:.0f} ms" if self.latencies else "-"
+        frame_time = f"{self.frame_times[-1]:.1f} ms" if self.frame_times else "-"
+        self.overlay_text = f"FPS {self.fps():.0f}  fotograma {frame_time}  latencia {latency}"
+        return True
+
+    # Dibuja la superposición de FPS y latencia en su región
+    def draw_overlay(self, screen, rect):
+        if not self.show_overlay:
+            return
+        x, y, width, height = rect
+        cv2.rectangle(screen, (x, y), (x + width, y + height), BLACK, -1)
+        cv2.putText(screen, self.overlay_text, (x + height // 4, y + 3 * height // 4),
+                    cv2.FONT_HERSHEY_SIMPLEX, height / 60, GREEN, max(1, height // 30))
+
+    # Escribe la traza en formato Chrome trace (JSON)
+    def export_chrome_trace(self, path):
+        with open(path, 'w') as trace_file:
+            json.dump({'traceEvents': list(self.events), 'displayTimeUnit': 'ms'}, trace_file)
+
+    # Resumen legible de las etapas, animaciones, fotogramas y latencias
+    def summary(self):
+        lines = ["Etapa                 veces   media ms"]
+        for name, (count, total) in sorted(self.stage_totals.items(), key=lambda item: -item[1][1]):
+            lines.append(f"{name:<20} {count:>6} {total / count:>10.3f}")
+        for name, (count, total) in sorted(self.animation_totals.items()):
+            lines.append(f"animacion {name:<10} {count:>6} {total / count:>10.1f}")
+        if self.frame_times:
+            lines.append("Tiempo de fotograma (ms):")
+            for low, high, count in self.frame_histogram():
+                lines.append(f"  {low:>5.0f} - {high:<5.0f} {count:>7}")
+        if self.dropped_frames:
+            lines.append(f"Fotogramas descartados: {self.dropped_frames}")
+        if self.latencies:
+            lines.append(f"Latencia de clic: media {np.mean(self.latencies):.1f} ms, "
+                         f"p95 {np.percentile(self.latencies, 95):.1f} ms")
+        if self.input_delays:
+            lines.append(f"Espera en la cola de entrada: media {np.mean(self.input_delays):.1f} ms, "
+                         f"máx {np.max(self.input_delays):.1f} ms")
+        if self.dropped_events:
+            lines.append(f"Eventos de entrada perdidos: {self.dropped_events}")
+        return "\n".join(lines)
+
+    # Al terminar una partida con el perfilado activo se guarda la traza y se muestra el resumen
+    def finish_game(self):
+        if not self.enabled:
+            return
+        path = os.environ.get(TRACE_PATH_ENV, DEFAULT_TRACE_PATH)
+        self.export_chrome_trace(path)
+        print(self.summary())
+        print(f"Traza guardada en {path}")
+
+class Tween:
+    # Animación con instante de inicio y duración (en ms) asociada a una región del compositor
+    def __init__(self, key, start, duration, draw_fn, on_finish=None, name='animacion'):
+        self.name = name
+        self.key = key
+        self.start = start
+        self.duration = duration
+        self.draw_fn = draw_fn  # draw_fn(frame, elapsed_ms)
+        self.on_finish = on_finish
+
+class Animador:
+    # Línea de tiempo de animaciones que el bucle principal avanza en cada tick, sin bloquear
+    def __init__(self):
+        self.tweens = []
+
+    # Programa una animación; start es el instante absoluto (ms) en que empieza
+    def add(self, key, start, duration, draw_fn, on_finish=None, name='animacion'):
+        tween = Tween(key, start, duration, draw_fn, on_finish, name)
+        self.tweens.append(tween)
+        return tween
+
+    def is_idle(self):
+        return not self.tweens
+
+    # Termina de golpe todas las animaciones, aplicando sus cambios de estado
+    def finish_all(self):
+        while self.tweens:
+            self.tick(max(tween.start + tween.duration for tween in self.tweens))
+
+    # Avanza la línea de tiempo y devuelve las regiones que hay que repintar
+    def tick(self, now):
+        touched = set()
+        active = []
+        finished = []
+        for tween in self.tweens:
+            if now >= tween.start:
+                touched.add(tween.key)
+            if now >= tween.start + tween.duration:
+                finished.append(tween)
+            else:
+                active.append(tween)
+        self.tweens = active
+
+        # Los callbacks de fin pueden cambiar el estado del juego y programar nuevas animaciones
+        for tween in finished:
+            perfilador.animation(tween.name, tween.start, now - tween.start)
+            if tween.on_finish is not None:
+                tween.on_finish()
+        return touched
+
+    # Dibuja sobre el buffer las animaciones que están en curso, en orden de inicio
+    def draw(self, frame, now):
+        drawn = False
+        for tween in sorted(self.tweens, key=lambda tween: tween.start):
+            if tween.start <= now < tween.start + tween.duration:
+                tween.draw_fn(frame, now - tween.start)
+                drawn = True
+        return drawn
+
 class Animaciones:
     # Función para dibujar un círculo en el centro de una carta
-    def draw_circle_on_card(x, y, color=GREEN, radius=20, thickness=5, duration=500):
-        center_x = x + CARD_WIDTH // 2
-        center_y = y + CARD_HEIGHT // 2
-        cv2.circle(screen, (center_x, center_y), radius, color, thickness)
-        cv2.imshow('Memory Game', screen)
-        cv2.waitKey(duration)
+    # Las marcas se dibujan una vez por tamaño de carta como sprites con máscara
+    def draw_circle_on_card(screen, x, y, color=GREEN, radius=20, thickness=5):
+        def draw(canvas, mask_color):
+            cv2.circle(canvas, (CARD_WIDTH // 2, CARD_HEIGHT // 2), radius, mask_color or color, thickness)
+
+        sprite = Capas.cached(('circulo', CARD_WIDTH, CARD_HEIGHT, color, radius, thickness),
+                              lambda: Capas.make_sprite(CARD_WIDTH, CARD_HEIGHT, draw))
+        Capas.blit(screen, sprite, x, y)
 
     # Función para dibujar una cruz en una carta
-    def draw_cross_on_card(x, y, color=RED, thickness=5, duration=500):
-        start_point1 = (x + 10, y + 10)
-        end_point1 = (x + CARD_WIDTH - 10, y + CARD_HEIGHT - 10)
-        start_point2 = (x + 10, y + CARD_HEIGHT - 10)
-        end_point2 = (x + CARD_WIDTH - 10, y + 10)
-        
-        cv2.line(screen, start_point1, end_point1, color, thickness)
-        cv2.line(screen, start_point2, end_point2, color, thickness)
-        cv2.imshow('Memory Game', screen)
-        cv2.waitKey(duration)
+    def draw_cross_on_card(screen, x, y, color=RED, thickness=5):
+        def draw(canvas, mask_color):
+            cv2.line(canvas, (10, 10), (CARD_WIDTH - 10, CARD_HEIGHT - 10), mask_color or color, thickness)
+            cv2.line(canvas, (10, CARD_HEIGHT - 10), (CARD_WIDTH - 10, 10), mask_color or color, thickness)
+
+        sprite = Capas.cached(('cruz', CARD_WIDTH, CARD_HEIGHT, color, thickness),
+                              lambda: Capas.make_sprite(CARD_WIDTH, CARD_HEIGHT, draw))
+        Capas.blit(screen, sprite, x, y)
         
-    # Función para voltear una carta con animación de giro
-    def flip_card(card_image, x, y, back_image=None, back_color=(255, 0, 0)):
-        if back_image is None:
+    # Hojas de animación ya escaladas: (id de imagen, tamaño, pasos) -> (imagen, tira, anchos, desplazamientos)
+    # Se guarda la imagen original para que su id no pueda reutilizarse mientras esté en la caché, así que
+    # la caché está limitada en bytes (imagen y tira) para no retener las caras que ya ha soltado la de caras
+    _flip_sheets = paquetes.CacheLRU(FLIP_SHEET_CACHE_BYTES)
+    _solid_backs = {}
+
+    # Función para obtener la hoja de animación de giro de una imagen
+    # Todos los fotogramas escalados se guardan uno tras otro en una única tira contigua
+    def get_flip_sheet(image, steps=FLIP_STEPS):
+        key = (id(image), image.shape, steps)
+        entry = Animaciones._flip_sheets.get(key)
+        if entry is not None and entry[0] is image:
+            return entry[1:]
+
+        height, width = image.shape[:2]
+        widths = [max(1, int(width * scale)) for scale in np.linspace(1, 0, num=steps)]
+        offsets = np.concatenate(([0], np.cumsum(widths)[:-1]))
+        strip = np.empty((height, sum(widths), 3), dtype=np.uint8)
+        for scaled_width, offset in zip(widths, offsets):
+            strip[:, offset:offset + scaled_width] = cv2.resize(image, (scaled_width, height))
+        strip.flags.writeable = False
+
+        Animaciones._flip_sheets.put(key, (image, strip, widths, offsets), image.nbytes + strip.nbytes)
+        return strip, widths, offsets
+
+    # Función para obtener un reverso liso de un color, creado una sola vez
+    def get_solid_back(color):
+        card_back = Animaciones._solid_backs.get((color, CARD_WIDTH, CARD_HEIGHT))
+        if card_back is None:
             card_back = np.zeros((CARD_HEIGHT, CARD_WIDTH, 3), dtype=np.uint8)
-            cv2.rectangle(card_back, (0, 0), (CARD_WIDTH, CARD_HEIGHT), back_color, -1)
+            cv2.rectangle(card_back, (0, 0), (CARD_WIDTH, CARD_HEIGHT), color, -1)
+            Animaciones._solid_backs[(color, CARD_WIDTH, CARD_HEIGHT)] = card_back
+        return card_back
+
+    # Función para dibujar un fotograma de la hoja de animación centrado en la carta
+    def draw_flip_frame(screen, sheet, index, x, y):
+        strip, widths, offsets = sheet
+        scaled_width, offset = widths[index], offsets[index]
+        offset_x = (CARD_WIDTH - scaled_width) // 2
+        screen[y:y + CARD_HEIGHT, x:x + CARD_WIDTH] = (0, 0, 0)
+        screen[y:y + CARD_HEIGHT, x + offset_x:x + offset_x + scaled_width] = strip[:, offset:offset + scaled_width]
+
+    # Duración total (ms) de un giro: las dos mitades más la pausa final con la cara visible
+    def flip_duration(fps=FLIP_FPS):
+        return 2 * FLIP_STEPS * max(1, int(1000 / fps)) + FLIP_HOLD_MS
+
+    # Función que crea el dibujo de una animación de giro para programarla en el Animador
+    def flip_card(card_image, x, y, back_image=None, back_color=(255, 0, 0), fps=FLIP_FPS):
+        if back_image is None:
+            card_back = Animaciones.get_solid_back(back_color)
         else:
             card_back = back_image
 
-        for scale in np.linspace(1, 0, num=10):
-            screen[y:y + CARD_HEIGHT, x:x + CARD_WIDTH] = (0, 0, 0)
-            scaled_width = max(1, int(CARD_WIDTH * scale))
-            scaled_image = cv2.resize(card_back, (scaled_width, CARD_HEIGHT))
-            offset_x = (CARD_WIDTH - scaled_width) // 2
-            screen[y:y + CARD_HEIGHT, x + offset_x:x + offset_x + scaled_width] = scaled_image
-            cv2.imshow('Memory Game', screen)
-            cv2.waitKey(15)
-
-        for scale in np.linspace(0, 1, num=10):
-            screen[y:y + CARD_HEIGHT, x:x + CARD_WIDTH] = (0, 0, 0)
-            scaled_width = max(1, int(CARD_WIDTH * scale))
-            scaled_image = cv2.resize(card_image, (scaled_width, CARD_HEIGHT))
-            offset_x = (CARD_WIDTH - scaled_width) // 2
-            screen[y:y + CARD_HEIGHT, x + offset_x:x + offset_x + scaled_width] = scaled_image
-            cv2.imshow('Memory Game', screen)
-            cv2.waitKey(15)
-
-        screen[y:y + CARD_HEIGHT, x:x + CARD_WIDTH] = card_image
-        cv2.imshow('Memory Game', screen)
-        cv2.waitKey(120)
+        frame_delay = max(1, int(1000 / fps))
+        back_sheet = Animaciones.get_flip_sheet(card_back)
+        front_sheet = Animaciones.get_flip_sheet(card_image)
+
+        # El reverso se encoge y después la cara crece, usando la misma tira en orden inverso
+        def draw(screen, elapsed):
+            index = int(elapsed // frame_delay)
+            if index < FLIP_STEPS:
+                Animaciones.draw_flip_frame(screen, back_sheet, index, x, y)
+            elif index < 2 * FLIP_STEPS:
+                Animaciones.draw_flip_frame(screen, front_sheet, 2 * FLIP_STEPS - 1 - index, x, y)
+            else:
+                screen[y:y + CARD_HEIGHT, x:x + CARD_WIDTH] = card_image
+
+        return draw
         
+class Disposicion:
+    # Posiciones y tamaños de todo lo que se dibuja para un tamaño de ventana concreto.
+    # Los valores de diseño están pensados para 1920x1080 y se escalan al tamaño real;
+    # se calcula una vez cada vez que cambia el tamaño de la ventana.
+    def __init__(self, width, height, rows=0, cols=0):
+        self.size = (width, height)
+        self.width, self.height = width, height
+        self.scale = min(width / FULL_SCREEN_WIDTH, height / FULL_SCREEN_HEIGHT)
+        scale = self.scale
+
+        # Estilo de los botones y del texto
+        self.button_radius = max(2, int(20 * scale))
+        self.font_scale = scale
+        self.font_thickness = max(1, round(2 * scale))
+
+        # Botones Menu y Help de la partida: (x, y, ancho, alto)
+        margin = int(EXIT_BUTTON_MARGIN * scale)
+        exit_width, exit_height = int(EXIT_BUTTON_WIDTH * scale), int(EXIT_BUTTON_HEIGHT * scale)
+        self.exit_button = (width - exit_width - margin, margin, exit_width, exit_height)
+        self.help_button = (int(HELP_BUTTON_MARGIN * scale), margin,
+                            int(HELP_BUTTON_WIDTH * scale), int(HELP_BUTTON_HEIGHT * scale))
+        self.button_text_offset = (int(40 * scale), int(40 * scale))
+
+        # Menú principal: título y botones (x, y, ancho, alto, acción)
+        self.title_font_scale = 5 * scale
+        self.title_thickness = max(1, round(11 * scale))
+        self.title_y = int(200 * scale)
+        button_width, button_height = int(300 * scale), int(80 * scale)
+        button_spacing, start_y = int(40 * scale), int(300 * scale)
+        button_x = (width // 2 - button_width) // 2
+        actions = list(DIFFICULTY_SETTINGS) + ["EXIT"]
+        self.menu_buttons = [(button_x, start_y + i * (button_height + button_spacing), button_width, button_height, action)
+                             for i, action in enumerate(actions)]
+        # Botón para continuar la última partida, a la derecha del primero
+        self.resume_button = (button_x + button_width + button_spacing, start_y, button_width, button_height, "CONTINUE")
+
+        # Tablero: tamaño de las cartas y esquina superior izquierda del tablero centrado
+        self.rows, self.cols = rows, cols
+        self.card_width, self.card_height, self.card_spacing = Tablero.fit_card_size(rows, cols, width, height, scale)
+        self.board_width = cols * (self.card_width + self.card_spacing) - self.card_spacing
+        self.board_height = rows * (self.card_height + self.card_spacing) - self.card_spacing
+        self.board_origin = ((width - self.board_width) // 2, (height - self.board_height) // 2)
+
+    # Función para consultar el tamaño real de la ventana; si no se puede, se usa 1920x1080
+    def window_size(window_name):
+        try:
+            _, _, width, height = cv2.getWindowImageRect(window_name)
+        except cv2.error:
+            width = height = 0
+        if width <= 0 or height <= 0:
+            return FULL_SCREEN_WIDTH, FULL_SCREEN_HEIGHT
+        return width, height
+
+    # Convierte esta disposición en la activa y actualiza las dimensiones globales de la partida
+    def activate(self):
+        global layout, ROWS, COLS, CARD_WIDTH, CARD_HEIGHT, CARD_SPACING, BOARD_WIDTH, BOARD_HEIGHT
+        layout = self
+        ROWS, COLS = self.rows, self.cols
+        CARD_WIDTH, CARD_HEIGHT, CARD_SPACING = self.card_width, self.card_height, self.card_spacing
+        BOARD_WIDTH, BOARD_HEIGHT = self.board_width, self.board_height
+        return self
+
 class Menu:
+    # Función para obtener los botones del menú; Continuar solo aparece si hay una partida a medias
+    @staticmethod
+    def menu_buttons(can_resume=False):
+        return layout.menu_buttons + ([layout.resume_button] if can_resume else [])
+
+    # Función para obtener el texto y los colores (normal, hover, pulsado) de un botón del menú
+    @staticmethod
+    def button_style(action):
+        if action == "EXIT":
+            return "Salir", (RED, HOVER_RED, PRESSED_RED)
+        if action == "CONTINUE":
+            return "Continuar", (BLUE, HOVER_BLUE, PRESSED_BLUE)
+        return action, (ORANGE, HOVER_ORANGE, PRESSED_ORANGE)
+
+    # Función para obtener la capa estática del menú: fondo, título y botones sin resaltar
+    @staticmethod
+    def static_layer(can_resume=False):
+        def render():
+            # Cargar la imagen de fondo al tamaño de la ventana (desde la caché de recursos)
+            menu_screen = Recursos.get_image(MENU_BACKGROUND_PATH, layout.size).copy()
+
+            # Título del menú
+            title = 'EMPAREJADOS'
+            title_size = cv2.getTextSize(title, cv2.FONT_HERSHEY_SIMPLEX, layout.title_font_scale, 2)[0]
+            title_x = (layout.width - title_size[0]) // 2
+            cv2.putText(menu_screen, title, (title_x, layout.title_y),
+                        cv2.FONT_HERSHEY_SIMPLEX, layout.title_font_scale, RED, layout.title_thickness)
+
+            # Botones de cada dificultad y el de salida en las posiciones de la disposición
+            for button_x, button_y, button_width, button_height, action in Menu.menu_buttons(can_resume):
+                text, colors = Menu.button_style(action)
+                Capas.blit(menu_screen, Capas.button_sprite(button_width, button_height, text, colors[0]),
+                           button_x, button_y)
+            menu_screen.flags.writeable = False
+            return menu_screen
+
+        return Capas.cached(('menu', can_resume), render)
+
     # Función para mostrar el menú de selección de dificultad
+    # Sin botón resaltado se devuelve la capa estática (de solo lectura); si no, una copia con el sprite encima
     @staticmethod
-    def draw_difficulty_menu():
-        # Cargar la imagen de fondo
-        menu_background_image = cv2.imread('./imagenes/FondoMenu.jpg')
-        menu_background_image = cv2.resize(menu_background_image, (FULL_SCREEN_WIDTH, FULL_SCREEN_HEIGHT))
-        
-        # Crear la pantalla usando el fondo
-        menu_screen = menu_background_image.copy()
-        
-        # Título del menú
-        title = 'EMPAREJADOS'
-        title_size = cv2.getTextSize(title, cv2.FONT_HERSHEY_SIMPLEX, 5, 2)[0]
-        title_x = (FULL_SCREEN_WIDTH - title_size[0]) // 2
-        cv2.putText(menu_screen, title, (title_x, 200), 
-                    cv2.FONT_HERSHEY_SIMPLEX, 5, RED, 11)
-
-        # Crear botones para cada dificultad
-        button_height = 80
-        button_width = 300
-        button_spacing = 40
-        start_y = 300
-        
-        # Almacenar las posiciones de los botones
-        button_positions = []
-        
-        # Agregar botones de dificultad
-        for i, difficulty in enumerate(DIFFICULTY_SETTINGS.keys()):
-            # Calcular posición del botón
-            button_x = (FULL_SCREEN_WIDTH // 2 - button_width) // 2
-            button_y = start_y + i * (button_height + button_spacing)
-            
-            # Dibujar el botón con esquinas redondeadas
-            draw_rounded_rectangle(menu_screen, 
-                                (button_x, button_y),
-                                (button_x + button_width, button_y + button_height),
-                                ORANGE, radius=20)
-            
-            # Añadir texto al botón
-            text_size = cv2.getTextSize(difficulty, cv2.FONT_HERSHEY_SIMPLEX, 1, 2)[0]
-            text_x = button_x + (button_width - text_size[0]) // 2
-            text_y = button_y + (button_height + text_size[1]) // 2
-            cv2.putText(menu_screen, difficulty, (text_x, text_y),
-                        cv2.FONT_HERSHEY_SIMPLEX, 1, WHITE, 2)
-            
-            # Guardar la posición y dimensiones del botón
-            button_positions.append((button_x, button_y, button_width, button_height, difficulty))
-        
-        # Agregar botón de salida
-        exit_button_x = (FULL_SCREEN_WIDTH // 2 - button_width) // 2
-        exit_button_y = start_y + len(DIFFICULTY_SETTINGS) * (button_height + button_spacing)
-        
-        draw_rounded_rectangle(menu_screen,
-                            (exit_button_x, exit_button_y),
-                            (exit_button_x + button_width, exit_button_y + button_height),
-                            RED, radius=20)
-        
-        exit_text = "Salir"
-        text_size = cv2.getTextSize(exit_text, cv2.FONT_HERSHEY_SIMPLEX, 1, 2)[0]
-        text_x = exit_button_x + (button_width - text_size[0]) // 2
-        text_y = exit_button_y + (button_height + text_size[1]) // 2
-        cv2.putText(menu_screen, exit_text, (text_x, text_y),
-                    cv2.FONT_HERSHEY_SIMPLEX, 1, WHITE, 2)
-        
-        # Agregar el botón de salida a las posiciones
-        button_positions.append((exit_button_x, exit_button_y, button_width, button_height, "EXIT"))
-        
-        return menu_screen, button_positions
+    def draw_difficulty_menu(hovered=None, can_resume=False, pressed=False):
+        buttons = Menu.menu_buttons(can_resume)
+        menu_screen = Menu.static_layer(can_resume)
+        for button_x, button_y, button_width, button_height, action in buttons:
+            if action == hovered:
+                text, colors = Menu.button_style(action)
+                menu_screen = menu_screen.copy()
+                Capas.blit(menu_screen, Capas.button_sprite(button_width, button_height, text,
+                                                            colors[2] if pressed else colors[1]),
+                           button_x, button_y)
+        return menu_screen, buttons
 
+    # Función para registrar los botones del menú en un índice de regiones clicables
     @staticmethod
-    def handle_menu_click(x, y, button_positions):
-        # Verificar si el clic fue en algún botón
+    def build_hit_registry(button_positions):
+        registry = RegistroClics()
         for button_x, button_y, width, height, action in button_positions:
-            if (button_x <= x <= button_x + width and 
-                button_y <= y <= button_y + height):
-                return action
-        return None
+            registry.add(action, (button_x, button_y, width, height))
+        return registry
 
     @staticmethod
-    def select_difficulty():
-        menu_screen, button_positions = Menu.draw_difficulty_menu()
-        selected_action = [None]  # Usar lista para poder modificarla desde el callback
-        
-        def menu_mouse_callback(event, x, y, flags, param):
-            if event == cv2.EVENT_LBUTTONDOWN:
-                action = Menu.handle_menu_click(x, y, button_positions)
-                if action:
-                    selected_action[0] = action
+    def handle_menu_click(x, y, registry):
+        # Verificar si el clic fue en algún botón
+        hit = registry.lookup(x, y)
+        return hit[0] if hit else None
+
+    @staticmethod
+    def select_difficulty(can_resume=False):
+        selected_action = None
+        hover = None
+        held = None  # Botón sobre el que se pulsó; se elige al soltar encima de él
+        registry = RegistroClics()
+        entrada = EntradaRaton()
 
         cv2.namedWindow('Memory Game', cv2.WND_PROP_FULLSCREEN)
         cv2.setWindowProperty('Memory Game', cv2.WND_PROP_FULLSCREEN, cv2.WINDOW_FULLSCREEN)
-        cv2.setMouseCallback('Memory Game', menu_mouse_callback)
+        cv2.setMouseCallback('Memory Game', entrada.callback)
         
-        while selected_action[0] is None:
-            cv2.imshow('Memory Game', menu_screen)
+        menu_state = None
+        while selected_action is None:
+            # El menú solo se vuelve a dibujar y mostrar si cambia el tamaño de la ventana, el botón resaltado
+            # o si está pulsado
+            window_size = Disposicion.window_size('Memory Game')
+            if window_size != layout.size or menu_state is None:
+                Disposicion(*window_size).activate()
+                registry = Menu.build_hit_registry(Menu.menu_buttons(can_resume))
+                menu_state = None
+            for _, _, kind, x, y, _ in entrada.drain(time.perf_counter() * 1000):
+                hover = Menu.handle_menu_click(x, y, registry)
+                if kind == INPUT_DOWN:
+                    held = hover
+                elif kind == INPUT_UP:
+                    if held is not None and hover == held:
+                        selected_action = held
+                        break
+                    held = None
+            if selected_action is not None:
+                break
+            pressed = held is not None and hover == held
+            if menu_state != (window_size, hover, pressed):
+                menu_state = (window_size, hover, pressed)
+                menu_screen, _ = Menu.draw_difficulty_menu(hover, can_resume, pressed)
+                cv2.imshow('Memory Game', menu_screen)
             key = cv2.waitKey(1) & 0xFF
             if key == 27:  # ESC
-                selected_action[0] = "EXIT"
+                selected_action = "EXIT"
         
-        return selected_action[0]
+        return selected_action
             
 class Botones:
-    # Función para dibujar el botón Exit
-    def draw_exit_button(screen):
-        x = FULL_SCREEN_WIDTH - EXIT_BUTTON_WIDTH - EXIT_BUTTON_MARGIN
-        y = EXIT_BUTTON_MARGIN
-        
-        # Dibujar el botón con esquinas redondeadas
-        draw_rounded_rectangle(screen, 
-                            (x, y), 
-                            (x + EXIT_BUTTON_WIDTH, y + EXIT_BUTTON_HEIGHT), 
-                            BLUE, radius=20)
+    # Función para dibujar un botón de la partida con su texto
+    def draw_button(screen, rect, text, hovered=False, pressed=False):
+        x, y, width, height = rect
         
-        # Añadir texto al botón
-        cv2.putText(screen, 'Menu', (x + 40, y + 40), 
-                    cv2.FONT_HERSHEY_SIMPLEX, 1, WHITE, 2)
+        # Copiar el sprite del botón (esquinas redondeadas y texto) en el estado que corresponda
+        color = PRESSED_BLUE if pressed else HOVER_BLUE if hovered else BLUE
+        Capas.blit(screen, Capas.button_sprite(width, height, text, color, layout.button_text_offset), x, y)
         
         return x, y
 
+    # Función para dibujar el botón Exit
+    def draw_exit_button(screen, hovered=False, pressed=False):
+        return Botones.draw_button(screen, layout.exit_button, 'Menu', hovered, pressed)
 
     # Función para dibujar el botón Help
-    def draw_help_button(screen):
-        x = HELP_BUTTON_MARGIN
-        y = EXIT_BUTTON_MARGIN
-        
-        # Dibujar el botón con esquinas redondeadas
-        draw_rounded_rectangle(screen, 
-                            (x, y), 
-                            (x + HELP_BUTTON_WIDTH, y + HELP_BUTTON_HEIGHT), 
-                            BLUE, radius=20)
-        
-        # Añadir texto al botón
-        cv2.putText(screen, 'Help', (x + 40, y + 40), 
-                    cv2.FONT_HERSHEY_SIMPLEX, 1, WHITE, 2)
-        
-        return x, y
-
-
-    # Función para detectar si se ha hecho clic en el botón Exit
-    def is_exit_button_clicked(mouse_x, mouse_y, button_x, button_y):
-        return (button_x <= mouse_x <= button_x + EXIT_BUTTON_WIDTH and
-                button_y <= mouse_y <= button_y + EXIT_BUTTON_HEIGHT)
-
-    # Función para detectar si se ha hecho clic en el botón Help
-    def is_help_button_clicked(mouse_x, mouse_y, button_x, button_y):
-        return (button_x <= mouse_x <= button_x + HELP_BUTTON_WIDTH and
-                button_y <= mouse_y <= button_y + HELP_BUTTON_HEIGHT)
+    def draw_help_button(screen, hovered=False, pressed=False):
+        return Botones.draw_button(screen, layout.help_button, 'Help', hovered, pressed)
 
-    # Función para encontrar una pareja no descubierta
-    def find_unmatched_pair(board, flipped):
-        # Crear un diccionario para almacenar las posiciones de las cartas
-        card_positions = {}
-        
-        for i in range(ROWS):
-            for j in range(COLS):
-                if not flipped[i, j]:  # Solo considerar cartas no volteadas
-                    card_value = board[i, j]
-                    if card_value in card_positions:
-                        # Encontramos un par
-                        return (i, j), card_positions[card_value]
-                    else:
-                        card_positions[card_value] = (i, j)
-        return None, None
+    # Función para encontrar una pareja no descubierta con el índice de parejas del motor
+    def find_unmatched_pair(pair_index, strategy=motor.HINT_ANY):
+        return pair_index.hint(strategy)
 
     # Función para resaltar una carta con borde rojo
     def highlight_card(screen, row, col, margin_x, margin_y):
         x = margin_x + col * (CARD_WIDTH + CARD_SPACING)
         y = margin_y + row * (CARD_HEIGHT + CARD_SPACING)
-        thickness = 3
+        thickness = Tablero.border_width()
         cv2.rectangle(screen, 
                     (x - thickness, y - thickness), 
                     (x + CARD_WIDTH + thickness, y + CARD_HEIGHT + thickness), 
                     BLUE, 
                     thickness)
         
+class Atlas:
+    # Todas las caras de una partida en un único array contiguo (caras, alto, ancho, 3)
+    # Se indexa como una lista de imágenes: atlas[valor] es una vista de la cara de ese valor
+    # Las caras que no se han podido leer (None) se quedan en negro
+    def __init__(self, images, selection):
+        if any(image is None for image in images):
+            blank = np.zeros((CARD_HEIGHT, CARD_WIDTH, 3), dtype=np.uint8)
+            blank.flags.writeable = False
+            images = [blank if image is None else image for image in images]
+        self.faces = np.ascontiguousarray(np.stack(images))
+        self.faces.flags.writeable = False
+        # Imágenes originales de la caché de caras, que sirven de clave estable para las hojas de giro
+        self.sources = list(images)
+        # Posición de cada cara en el paquete de cartas, para rehacer el atlas a otro tamaño
+        self.selection = selection
+
+    # Crea el mismo atlas con las caras del paquete decodificadas al tamaño de carta actual
+    def rescaled(self, pack):
+        return Atlas(pack.faces(self.selection, (CARD_WIDTH, CARD_HEIGHT)), self.selection)
+
+    def __getitem__(self, value):
+        return self.faces[value]
+
+    def __len__(self):
+        return len(self.faces)
+
 class Tablero:
-    # Función para cargar las imágenes
-    def load_images(image_folder):
-        images = []
-        for filename in os.listdir(image_folder):
-            img_path = os.path.join(image_folder, filename)
-            img = cv2.imread(img_path)
-            if img is not None:
-                img = cv2.resize(img, (CARD_WIDTH, CARD_HEIGHT))
-                images.append(img)
-        return images
+    # Función para calcular el tamaño de carta y el espacio para que el tablero quepa en pantalla
+    # Nunca se agrandan por encima del tamaño predeterminado multiplicado por la escala de la pantalla
+    def fit_card_size(rows, cols, screen_width=FULL_SCREEN_WIDTH, screen_height=FULL_SCREEN_HEIGHT, ui_scale=1.0):
+        if not rows or not cols:
+            return DEFAULT_CARD_WIDTH, DEFAULT_CARD_HEIGHT, DEFAULT_CARD_SPACING
+
+        # Se reserva la franja de los botones arriba y la misma abajo para que el tablero quede centrado
+        button_band = int((2 * EXIT_BUTTON_MARGIN + EXIT_BUTTON_HEIGHT) * ui_scale)
+        available_width = screen_width - int(2 * EXIT_BUTTON_MARGIN * ui_scale)
+        available_height = screen_height - 2 * button_band
+
+        default_width = cols * (DEFAULT_CARD_WIDTH + DEFAULT_CARD_SPACING) - DEFAULT_CARD_SPACING
+        default_height = rows * (DEFAULT_CARD_HEIGHT + DEFAULT_CARD_SPACING) - DEFAULT_CARD_SPACING
+        scale = min(ui_scale, available_width / default_width, available_height / default_height)
+
+        card_width = max(1, int(DEFAULT_CARD_WIDTH * scale))
+        card_height = max(1, int(DEFAULT_CARD_HEIGHT * scale))
+        card_spacing = max(MIN_CARD_SPACING, int(DEFAULT_CARD_SPACING * scale))
+        return card_width, card_height, card_spacing
+
+
+    # Función para obtener la capa estática de la partida: fondo y botones sin resaltar
+    def static_layer():
+        def render():
+            background = Recursos.get_image(BOARD_BACKGROUND_PATH, layout.size).copy()
+            Botones.draw_exit_button(background)
+            Botones.draw_help_button(background)
+            background.flags.writeable = False
+            return background
+
+        return Capas.cached(('tablero',), render)
+
+    # Función para abrir el paquete de cartas; solo lee su índice, no las imágenes
+    def load_pack(pack_path=CARD_PACK_PATH):
+        try:
+            pack = paquetes.open_pack(pack_path)
+        except (OSError, ValueError) as error:
+            print(f"Error: No se puede abrir el paquete de cartas: {error}")
+            exit()
+        if not len(pack):
+            print("Error: No hay imágenes de cartas.")
+            exit()
+        return pack
 
     # Función para centrar el tablero en la pantalla completa
     def center_board():
-        margin_x = (FULL_SCREEN_WIDTH - BOARD_WIDTH) // 2
-        margin_y = (FULL_SCREEN_HEIGHT - BOARD_HEIGHT) // 2
-        return margin_x, margin_y
+        return layout.board_origin
 
     # Función para crear el tablero con las cartas
-    def create_board(rows, cols, images):
+    # Si hay menos imágenes que parejas, algunas caras se repiten y cualquier par de ellas empareja
+    # Solo se decodifican las caras elegidas, al tamaño de carta actual
+    def create_board(rows, cols, pack, rng=random):
         num_pairs = (rows * cols) // 2
-        if len(images) < num_pairs:
-            print(f"Error: Necesitas al menos {num_pairs} imágenes diferentes.")
+        selection, faces = pack.sample_faces(rng, num_pairs, (CARD_WIDTH, CARD_HEIGHT))
+        if not faces:
+            print("Error: No hay imágenes de cartas.")
             exit()
-        selected_images = random.sample(images, num_pairs)
-        card_indices = list(range(num_pairs)) * 2
-        random.shuffle(card_indices)
-        return np.array(card_indices).reshape((rows, cols)), selected_images
+        atlas = Atlas(faces, selection)
+        return motor.create_board(rows, cols, rng, num_values=len(selection)), atlas
+
+    # Función para obtener la posición en pantalla de una carta
+    def card_position(row, col, margin_x, margin_y):
+        return margin_x + col * (CARD_WIDTH + CARD_SPACING), margin_y + row * (CARD_HEIGHT + CARD_SPACING)
+
+    # Dibuja una sola carta, boca arriba o boca abajo según su estado
+    def draw_card(board, flipped, images, screen, back_image, row, col, margin_x, margin_y):
+        x, y = Tablero.card_position(row, col, margin_x, margin_y)
+        if flipped[row, col]:
+            screen[y:y + CARD_HEIGHT, x:x + CARD_WIDTH] = images[board[row, col]]
+        else:
+            screen[y:y + CARD_HEIGHT, x:x + CARD_WIDTH] = back_image
 
     # Dibuja el tablero
     def draw_board(board, flipped, images, screen, back_image):
         margin_x, margin_y = Tablero.center_board()
         for i in range(ROWS):
             for j in range(COLS):
-                x, y = margin_x + j * (CARD_WIDTH + CARD_SPACING), margin_y + i * (CARD_HEIGHT + CARD_SPACING)
-                if flipped[i, j]:
-                    screen[y:y + CARD_HEIGHT, x:x + CARD_WIDTH] = images[board[i, j]]
-                else:
-                    screen[y:y + CARD_HEIGHT, x:x + CARD_WIDTH] = back_image
+                Tablero.draw_card(board, flipped, images, screen, back_image, i, j, margin_x, margin_y)
 
         return screen
 
+    # Margen alrededor de cada carta que se repinta con ella: no puede pasar de la mitad del espacio
+    # entre cartas, o se solaparía con la región de la carta vecina
+    def dirty_margin():
+        return min(CARD_DIRTY_MARGIN, CARD_SPACING // 2)
+
+    # Grosor de los bordes que se dibujan alrededor de una carta (pista y hover): tienen que quedar
+    # dentro del margen que se repinta con ella, o dejarían restos al borrarse
+    def border_width():
+        return max(1, Tablero.dirty_margin() // 2)
+
+    # Función para marcar la carta que está bajo el ratón con un borde blanco
+    def draw_hover_outline(screen, row, col, margin_x, margin_y):
+        x, y = Tablero.card_position(row, col, margin_x, margin_y)
+        offset = max(1, Tablero.border_width() - 1)
+        cv2.rectangle(screen, (x - offset, y - offset), (x + CARD_WIDTH + offset - 1, y + CARD_HEIGHT + offset - 1),
+                      WHITE, offset)
+
+    # Registra cada carta del tablero como una región del compositor
+    # decorate(frame, fila, columna), si se indica, dibuja encima de la carta (por ejemplo el borde de hover)
+    def add_board_regions(compositor, board, flipped, images, back_image, decorate=None):
+        margin_x, margin_y = Tablero.center_board()
+        for i in range(ROWS):
+            for j in range(COLS):
+                x, y = Tablero.card_position(i, j, margin_x, margin_y)
+                dirty_margin = Tablero.dirty_margin()
+                rect = (x - dirty_margin, y - dirty_margin,
+                        CARD_WIDTH + 2 * dirty_margin, CARD_HEIGHT + 2 * dirty_margin)
+                def draw(frame, i=i, j=j):
+                    Tablero.draw_card(board, flipped, images, frame, back_image, i, j, margin_x, margin_y)
+                    if decorate is not None:
+                        decorate(frame, i, j)
+
+                compositor.add_region((i, j), rect, draw)
+
+    # Registra el tablero como una sola región clicable que resuelve la carta (sin los huecos)
+    def add_board_hit_region(registry):
+        margin_x, margin_y = Tablero.center_board()
+        registry.add('board', (margin_x, margin_y, BOARD_WIDTH, BOARD_HEIGHT), Game.detect_click)
+
 class Game:
     #Funcion para detectar el click
     @staticmethod
     def detect_click(x, y):
-        # Calcular la columna en la que se ha hecho clic
-        col = x // (CARD_WIDTH + CARD_SPACING)
-        # Calcular la fila en la que se ha hecho clic
-        row = y // (CARD_HEIGHT + CARD_SPACING)
+        # Los clics a la izquierda o por encima del tablero no son de ninguna carta
+        if x < 0 or y < 0:
+            return None
+
+        # Calcular la columna y la fila en la que se ha hecho clic
+        col, offset_x = divmod(x, CARD_WIDTH + CARD_SPACING)
+        row, offset_y = divmod(y, CARD_HEIGHT + CARD_SPACING)
         
-        # Verificar que el clic esté dentro del tablero
-        if col < COLS and row < ROWS:
+        # Verificar que el clic esté dentro del tablero y no en el espacio entre cartas
+        if col < COLS and row < ROWS and offset_x < CARD_WIDTH and offset_y < CARD_HEIGHT:
             return int(row), int(col)
         else:
             return None  # Retorna None si el clic está fuera del área del tablero
     
     @staticmethod
-    def run_game(difficulty):
-        global first_card, second_card, pairs_found, flipped, selectable, board, screen
-        global ROWS, COLS, BOARD_WIDTH, BOARD_HEIGHT  # Asegurar que se actualicen las variables globales
-        
-        # Obtener el número de filas y columnas para la dificultad seleccionada
-        ROWS, COLS = DIFFICULTY_SETTINGS[difficulty]
-        
-        # Calcular las dimensiones del tablero basadas en el tamaño de las cartas y el espacio entre ellas
-        BOARD_WIDTH = COLS * (CARD_WIDTH + CARD_SPACING) - CARD_SPACING
-        BOARD_HEIGHT = ROWS * (CARD_HEIGHT + CARD_SPACING) - CARD_SPACING
-        
-        # Cargar la imagen de fondo
-        background_image = cv2.imread('./imagenes/FondoTablero.jpg')
-        background_image = cv2.resize(background_image, (FULL_SCREEN_WIDTH, FULL_SCREEN_HEIGHT))
-        
-        # Crear la pantalla usando el fondo
-        screen = background_image.copy()
+    def run_game(difficulty, session_path=None):
+        if session_path is None:
+            # Obtener el número de filas y columnas para la dificultad seleccionada
+            rows, cols = DIFFICULTY_SETTINGS[difficulty]
+        else:
+            # Continuar una partida: el estado se recupera reproduciendo su registro con el motor
+            session = sesiones.Sesion(session_path)
+            rows, cols = session.rows, session.cols
+
+        # Calcular la disposición (tamaño de cartas, tablero y botones) para el tamaño real de la ventana
+        Disposicion(*Disposicion.window_size('Memory Game'), rows, cols).activate()
         
-        # Cargar imágenes y crear el tablero
-        image_folder = './imagenes/cartas'
-        images = Tablero.load_images(image_folder)
-        back_image = cv2.imread('./imagenes/CartaAtras.png')
-        back_image = cv2.resize(back_image, (CARD_WIDTH, CARD_HEIGHT))
+        # Abrir el paquete de cartas
+        pack = Tablero.load_pack()
         
-        board, selected_images = Tablero.create_board(ROWS, COLS, images)
-        flipped = np.zeros((ROWS, COLS), dtype=bool)
-        first_card, second_card = None, None
-        pairs_found = 0
-        selectable = True
-
-        # Definir función de callback para el ratón
-        def game_mouse_callback(event, x, y, flags, param):
-            global selectable, first_card, second_card, selectable, pairs_found
-            if event == cv2.EVENT_LBUTTONDOWN:
-                if Botones.is_exit_button_clicked(x, y, exit_button_x, exit_button_y):
-                    param['return_to_menu'] = True
-                    return
-                    
-                if Botones.is_help_button_clicked(x, y, help_button_x, help_button_y):
-                    margin_x, margin_y = Tablero.center_board()
-                    card1, card2 = Botones.find_unmatched_pair(board, flipped)
-                    
-                    if card1 and card2:
-                        Botones.highlight_card(screen, card1[0], card1[1], margin_x, margin_y)
-                        Botones.highlight_card(screen, card2[0], card2[1], margin_x, margin_y)
-                        cv2.imshow('Memory Game', screen)
-                        cv2.waitKey(1500)
-                    return
+        # Las reglas las lleva el motor; esta función solo dibuja, anima y traduce clics en acciones.
+        # Cada acción se registra en la sesión de la partida
+        if session_path is None:
+            seed = random.randrange(2 ** 31)
+            board, atlas = Tablero.create_board(ROWS, COLS, pack, random.Random(seed))
+            engine = Motor(ROWS, COLS, seed=seed, board=board)
+            session_log = sesiones.RegistroSesion.create(sesiones.new_session_path(SESSION_FOLDER, difficulty),
+                                                         engine, atlas.selection)
+        else:
+            with session:
+                engine = sesiones.replay(session)
+                duration = session.duration()
+            session_log = sesiones.RegistroSesion.reopen(session, duration)
+            # Si el paquete de cartas ha cambiado, las caras que ya no existen se sustituyen por otras
+            selection = [k % len(pack) for k in session.selection]
+            atlas = Atlas(pack.faces(selection, (CARD_WIDTH, CARD_HEIGHT)), selection)
+
+        # Aplica una acción en el motor y la añade al registro de la sesión
+        def play(action):
+            session_log.log(action)
+            return engine.step(action)
+
+        # Una pareja fallida que quedó boca arriba al salir se oculta al continuar
+        if engine.pending is not None:
+            play((motor.HIDE,))
+
+        animator = Animador()
+        compositor = back_image = registry = None
+        margin_x = margin_y = flip_duration = 0
+        hovered = None  # Región bajo el ratón: 'exit', 'help', una carta (fila, columna) o None
+        pressed = False  # Botón izquierdo del ratón mantenido
+
+        # Dibuja el borde de hover sobre la carta bajo el ratón si se puede voltear
+        def decorate_card(frame, row, col):
+            if hovered == (row, col) and engine.can_flip(row, col):
+                Tablero.draw_hover_outline(frame, row, col, margin_x, margin_y)
+
+        # Prepara todo lo que depende del tamaño de la ventana; se repite solo cuando cambia
+        def build_screen():
+            nonlocal compositor, atlas, back_image, registry, margin_x, margin_y, flip_duration
+
+            # Crear el compositor con el fondo al tamaño real; la pantalla es su buffer persistente
+            compositor = Compositor(Tablero.static_layer())
+
+            # Caras y reverso al tamaño de carta de esta disposición (desde las cachés de caras y recursos)
+            if atlas.faces.shape[1:3] != (CARD_HEIGHT, CARD_WIDTH):
+                atlas = atlas.rescaled(pack)
+            back_image = Recursos.get_image(CARD_BACK_PATH, (CARD_WIDTH, CARD_HEIGHT))
+
+            # Registrar las cartas y los botones como regiones del compositor
+            Tablero.add_board_regions(compositor, engine.board, engine.flipped, atlas, back_image, decorate_card)
+            exit_button_x, exit_button_y, exit_width, exit_height = layout.exit_button
+            help_button_x, help_button_y, help_width, help_height = layout.help_button
+            compositor.add_region('exit', (exit_button_x, exit_button_y, exit_width + 1, exit_height + 1),
+                                  lambda frame: Botones.draw_exit_button(frame, hovered == 'exit',
+                                                                           pressed and hovered == 'exit'))
+            compositor.add_region('help', (help_button_x, help_button_y, help_width + 1, help_height + 1),
+                                  lambda frame: Botones.draw_help_button(frame, hovered == 'help',
+                                                                           pressed and hovered == 'help'))
+
+            # Superposición de perfilado centrada arriba, entre los botones
+            overlay_width, overlay_height = int(600 * layout.scale), max(12, int(40 * layout.scale))
+            overlay_rect = ((layout.width - overlay_width) // 2, layout.exit_button[1], overlay_width, overlay_height)
+            compositor.add_region('perfil', overlay_rect,
+                                  lambda frame: perfilador.draw_overlay(frame, overlay_rect))
+
+            # Registrar los botones y el tablero en el índice de regiones clicables
+            registry = RegistroClics()
+            registry.add('exit', layout.exit_button)
+            registry.add('help', layout.help_button)
+            Tablero.add_board_hit_region(registry)
+
+            margin_x, margin_y = Tablero.center_board()
+            flip_duration = Animaciones.flip_duration()
+
+        build_screen()
+
+        # Programa las animaciones que corresponden a los eventos del motor
+        def animate_events(events, now):
+            for event in events:
+                kind = event[0]
+                if kind == motor.FLIP:
+                    row, col = event[1]
+                    card_x, card_y = Tablero.card_position(row, col, margin_x, margin_y)
+                    animator.add((row, col), now, flip_duration,
+                                 Animaciones.flip_card(atlas.sources[engine.board[row, col]], card_x, card_y,
+                                                       back_image), name='giro')
+
+                elif kind == motor.HINT:
+                    for card in event[1:]:
+                        animator.add(card, now, HINT_DURATION_MS,
+                                     lambda frame, elapsed, card=card: Botones.highlight_card(frame, card[0], card[1],
+                                                                                              margin_x, margin_y),
+                                     name='pista')
+
+                elif kind == motor.MATCH:
+                    # Los círculos aparecen uno tras otro y desaparecen a la vez
+                    marks_start = now + flip_duration
+                    for delay, card in enumerate(event[1:]):
+                        mark_x, mark_y = Tablero.card_position(card[0], card[1], margin_x, margin_y)
+                        animator.add(card, marks_start + delay * MARK_DURATION_MS, (2 - delay) * MARK_DURATION_MS,
+                                     lambda frame, elapsed, mark_x=mark_x, mark_y=mark_y:
+                                         Animaciones.draw_circle_on_card(frame, mark_x, mark_y), name='acierto')
+
+                elif kind == motor.MISMATCH:
+                    # Cruces, pausa y después se ocultan la segunda carta y luego la primera;
+                    # el motor oculta la pareja cuando termina la última animación
+                    first_card, second_card = event[1:]
+                    marks_start = now + flip_duration
+                    hide_start = marks_start + 2 * MARK_DURATION_MS + MISMATCH_DELAY_MS
 
-                margin_x, margin_y = Tablero.center_board()
-                row, col = Game.detect_click(x - margin_x, y - margin_y)
-                if row < ROWS and col < COLS and not flipped[row, col] and selectable:
-                    card_image = images[board[row, col]]
-                    Animaciones.flip_card(card_image, margin_x + col * (CARD_WIDTH + CARD_SPACING),
-                            margin_y + row * (CARD_HEIGHT + CARD_SPACING), back_image)
-
-                    flipped[row, col] = True
-                    if first_card is None:
-                        first_card = (row, col)
-                    else:
-                        second_card = (row, col)
-                        selectable = False
-
-                        card1 = board[first_card[0], first_card[1]]
-                        card2 = board[second_card[0], second_card[1]]
-
-                        if card1 == card2:
-                            pairs_found += 1
-
-                            Animaciones.draw_circle_on_card(margin_x + first_card[1] * (CARD_WIDTH + CARD_SPACING),
-                                                margin_y + first_card[0] * (CARD_HEIGHT + CARD_SPACING))
-                            Animaciones.draw_circle_on_card(margin_x + second_card[1] * (CARD_WIDTH + CARD_SPACING),
-                                                margin_y + second_card[0] * (CARD_HEIGHT + CARD_SPACING))
-
-                            first_card, second_card = None, None
-                            selectable = True
-                        else:
-                            Animaciones.draw_cross_on_card(margin_x + first_card[1] * (CARD_WIDTH + CARD_SPACING),
-                                            margin_y + first_card[0] * (CARD_HEIGHT + CARD_SPACING))
-                            Animaciones.draw_cross_on_card(margin_x + second_card[1] * (CARD_WIDTH + CARD_SPACING),
-                                            margin_y + second_card[0] * (CARD_HEIGHT + CARD_SPACING))
-
-                            cv2.waitKey(1000)
-                            Animaciones.flip_card(back_image, margin_x + col * (CARD_WIDTH + CARD_SPACING),
-                                    margin_y + row * (CARD_HEIGHT + CARD_SPACING), back_image)
-                            Animaciones.flip_card(back_image, margin_x + first_card[1] * (CARD_WIDTH + CARD_SPACING),
-                                    margin_y + first_card[0] * (CARD_HEIGHT + CARD_SPACING), back_image)
-                            flipped[first_card[0], first_card[1]] = False
-                            flipped[second_card[0], second_card[1]] = False
-                            first_card, second_card = None, None
-                            selectable = True
+                    for delay, card in enumerate((first_card, second_card)):
+                        mark_x, mark_y = Tablero.card_position(card[0], card[1], margin_x, margin_y)
+                        mark_start = marks_start + delay * MARK_DURATION_MS
+                        mark_end = hide_start + (1 - delay) * flip_duration
+                        animator.add(card, mark_start, mark_end - mark_start,
+                                     lambda frame, elapsed, mark_x=mark_x, mark_y=mark_y:
+                                         Animaciones.draw_cross_on_card(frame, mark_x, mark_y), name='fallo')
+
+                    # La segunda carta mantiene el reverso (último fotograma del giro) hasta el final
+                    card_x, card_y = Tablero.card_position(second_card[0], second_card[1], margin_x, margin_y)
+                    animator.add(second_card, hide_start, 2 * flip_duration,
+                                 Animaciones.flip_card(back_image, card_x, card_y, back_image), name='ocultar')
+                    card_x, card_y = Tablero.card_position(first_card[0], first_card[1], margin_x, margin_y)
+                    animator.add(first_card, hide_start + flip_duration, flip_duration,
+                                 Animaciones.flip_card(back_image, card_x, card_y, back_image),
+                                 on_finish=lambda: play((motor.HIDE,)), name='ocultar')
+
+        # Región (botón o carta) que hay bajo un punto de la pantalla
+        def hit_target(x, y):
+            hit = registry.lookup(x, y)
+            if hit is None:
+                return None
+            key, cell = hit
+            return cell if key == 'board' else key
+
+        # Procesa un clic en el tick del bucle principal
+        # Devuelve los eventos del motor que ha producido: sin ellos el clic no cambia nada en pantalla
+        def handle_click(x, y, now):
+            target = hit_target(x, y)
+            events = []
+            if target == 'exit':
+                callback_params['return_to_menu'] = True
+            elif target == 'help':
+                events = play((motor.HINT, HELP_HINT_STRATEGY))
+            elif target is not None and engine.can_flip(*target):
+                events = play((motor.FLIP,) + target)
+            animate_events(events, now)
+            return events
+
+        # Actualiza la región resaltada por el ratón (y si está pulsada) y repinta la anterior y la nueva;
+        # si solo cambia la pulsación, la región bajo el ratón es la misma y se repinta igualmente
+        def handle_move(x, y, is_pressed):
+            nonlocal hovered, pressed
+            target = hit_target(x, y)
+            if target != hovered or is_pressed != pressed:
+                compositor.mark_dirty(hovered)
+                compositor.mark_dirty(target)
+                hovered, pressed = target, is_pressed
+
+        # El callback del ratón solo encola los eventos; se aplican en el bucle principal, una vez por tick
+        entrada = EntradaRaton()
 
         callback_params = {'return_to_menu': False}
-        cv2.setMouseCallback('Memory Game', game_mouse_callback, callback_params)
+        cv2.setMouseCallback('Memory Game', entrada.callback, callback_params)
+
+        # El estado de la partida (motor, animaciones, compositor) lo comparten el hilo principal, que
+        # aplica la entrada, y el hilo de render, que compone; cada uno lo usa con state_lock tomado
+        state_lock = threading.Lock()
+        frames = ColaFotogramas(compositor.frame.shape)
+
+        # Trabajo de cada fotograma en el hilo de render: avanza las animaciones, repinta solo las
+        # regiones que han cambiado, dibuja encima las animaciones en curso y publica una copia del buffer
+        def compose(now):
+            with state_lock:
+                with perfilador.stage('animaciones'):
+                    for key in animator.tick(now):
+                        compositor.mark_dirty(key)
+                if perfilador.update_overlay(now):
+                    compositor.mark_dirty('perfil')
+                with perfilador.stage('render'):
+                    compositor.render()
+                with perfilador.stage('dibujo_animaciones'):
+                    if animator.draw(compositor.frame, now):
+                        compositor.needs_present = True
+                if not compositor.needs_present:
+                    return
+                compositor.needs_present = False
+                queue, sequence = frames, entrada.applied
+                with perfilador.stage('copia'):
+                    buffer = queue.acquire()
+                    np.copyto(buffer, compositor.frame)
+            queue.publish(buffer, sequence)
+
+        renderer = HiloRender(compose)
         
-        # Game loop
-        while not callback_params['return_to_menu']:
-            # Restablece el fondo antes de dibujar el tablero
-            screen = background_image.copy()
-            
-            # Dibuja el tablero, el botón de salida y el botón de ayuda en la pantalla
-            screen = Tablero.draw_board(board, flipped, images, screen, back_image)
-            exit_button_x, exit_button_y = Botones.draw_exit_button(screen)
-            help_button_x, help_button_y = Botones.draw_help_button(screen)
-            cv2.imshow('Memory Game', screen)
-            cv2.imshow('Memory Game', screen)
-
-            if pairs_found == (ROWS * COLS) // 2:
-                print("¡Has ganado!")
-                # Cargar la imagen
-                img = cv2.imread('./imagenes/Eliberio_fiesta.png')
-
-                # Crear una ventana y configurarla en modo pantalla completa
-                cv2.namedWindow('Victoria', cv2.WND_PROP_FULLSCREEN)
-                cv2.setWindowProperty('Victoria', cv2.WND_PROP_FULLSCREEN, cv2.WINDOW_FULLSCREEN)
-
-                # Mostrar la imagen
-                cv2.imshow('Victoria', img)
-
-                # Esperar a que se presione una tecla
-                cv2.waitKey(0)
-                
-                # Cerrar solo la ventana de la imagen
-                cv2.destroyWindow('Victoria')
-                
-                return True
-
-            key = cv2.waitKey(30) & 0xFF
-            if key == 27:  # ESC
-                return True
+        # Game loop: entrada y presentación en el hilo principal
+        try:
+            while not callback_params['return_to_menu']:
+                if renderer.error is not None:
+                    raise renderer.error
+                now = time.perf_counter() * 1000
+
+                with state_lock:
+                    # Si cambia el tamaño de la ventana se recalcula la disposición y se redibuja todo a ese tamaño;
+                    # las animaciones en curso tienen posiciones del tamaño anterior, así que se dan por terminadas
+                    window_size = Disposicion.window_size('Memory Game')
+                    if window_size != layout.size:
+                        animator.finish_all()
+                        Disposicion(*window_size, ROWS, COLS).activate()
+                        build_screen()
+                        perfilador.dropped_frames += frames.dropped
+                        frames = ColaFotogramas(compositor.frame.shape)
+
+                    # Los eventos se aplican en orden de llegada y todos con el instante del tick, así que
+                    # el resultado no depende de cuándo los entregue OpenCV dentro de cada espera
+                    with perfilador.stage('entrada'):
+                        batch = entrada.drain(now)
+                        for event in batch:
+                            _, _, kind, x, y, is_pressed = event
+                            handle_move(x, y, is_pressed)
+                            # Solo se mide la latencia de los clics que cambian algo en pantalla; los demás
+                            # esperarían a un fotograma posterior sin relación con ellos
+                            if kind == INPUT_DOWN and handle_click(x, y, now):
+                                entrada.track_click(event)
+                            if callback_params['return_to_menu']:
+                                break
+                    won = engine.is_won() and animator.is_idle()
+                    queue = frames
+
+                # Con entrada nueva el hilo de render no espera al siguiente intervalo
+                if batch:
+                    renderer.wake()
+
+                # Mostrar el fotograma más reciente, si hay uno nuevo
+                ready = queue.take()
+                if ready is not None:
+                    buffer, sequence = ready
+                    with perfilador.stage('present'):
+                        cv2.imshow('Memory Game', buffer)
+                    queue.release(buffer)
+                    shown_time = time.perf_counter() * 1000
+                    perfilador.frame(shown_time)
+                    entrada.frame_shown(sequence, shown_time)
+
+                if won:
+                    renderer.stop()
+                    print("¡Has ganado!")
+                    # Comparar los movimientos con el par: los esperados jugando con memoria perfecta
+                    par = jugadores.par(engine.num_pairs)
+                    score = f"Movimientos: {engine.moves}  (par {par:.1f}, eficiencia {par / max(engine.moves, 1):.0%})"
+                    print(score)
+
+                    # Cargar la imagen (copia, la de la caché es de solo lectura) y escribir la puntuación
+                    img = Recursos.get_image(VICTORY_IMAGE_PATH).copy()
+                    text_scale = img.shape[0] / FULL_SCREEN_HEIGHT
+                    text_thickness = max(1, round(2 * text_scale))
+                    (text_width, text_height), _ = cv2.getTextSize(score, cv2.FONT_HERSHEY_SIMPLEX, text_scale,
+                                                                   text_thickness)
+                    margin = int(30 * text_scale)
+                    text_y = img.shape[0] - 2 * margin
+                    draw_rounded_rectangle(img, (margin, text_y - text_height - margin // 2),
+                                           (2 * margin + text_width, text_y + margin // 2), BLACK,
+                                           radius=max(2, margin // 2))
+                    cv2.putText(img, score, (margin + margin // 2, text_y), cv2.FONT_HERSHEY_SIMPLEX, text_scale,
+                                WHITE, text_thickness)
+
+                    # Crear una ventana y configurarla en modo pantalla completa
+                    cv2.namedWindow('Victoria', cv2.WND_PROP_FULLSCREEN)
+                    cv2.setWindowProperty('Victoria', cv2.WND_PROP_FULLSCREEN, cv2.WINDOW_FULLSCREEN)
+
+                    # Mostrar la imagen
+                    cv2.imshow('Victoria', img)
+
+                    # Esperar a que se presione una tecla
+                    cv2.waitKey(0)
+                    
+                    # Cerrar solo la ventana de la imagen
+                    cv2.destroyWindow('Victoria')
+                    
+                    return True
+
+                with perfilador.stage('espera'):
+                    key = cv2.waitKey(IDLE_TICK_MS if animator.is_idle() else ANIMATION_TICK_MS) & 0xFF
+                if key == 27:  # ESC
+                    return True
+                if key == ord('p'):
+                    # Mostrar u ocultar la superposición; al mostrarla se activa también el perfilado
+                    with state_lock:
+                        perfilador.show_overlay = not perfilador.show_overlay
+                        perfilador.enabled = perfilador.enabled or perfilador.show_overlay
+                        perfilador.overlay_updated = 0
+                        compositor.mark_dirty('perfil')
+        finally:
+            renderer.stop()
+            perfilador.dropped_frames += frames.dropped
+            perfilador.dropped_events += entrada.dropped
+            perfilador.finish_game()
+            session_log.close()
 
         return True
 
 
+# Disposición inicial a 1920x1080 hasta que se conozca el tamaño real de la ventana
+layout = Disposicion(FULL_SCREEN_WIDTH, FULL_SCREEN_HEIGHT)
+
+# Perfilador del bucle del juego
+perfilador = Perfilador(enabled=os.environ.get(PROFILE_ENV) == '1')
+
 def main():
+    # Precargar las imágenes al tamaño de la ventana en segundo plano para que el menú aparezca al momento
+    cv2.namedWindow('Memory Game', cv2.WND_PROP_FULLSCREEN)
+    cv2.setWindowProperty('Memory Game', cv2.WND_PROP_FULLSCREEN, cv2.WINDOW_FULLSCREEN)
+    Recursos.preload(Recursos.startup_jobs(Disposicion(*Disposicion.window_size('Memory Game'))))
+
     while True:
-        # Mostrar menú y obtener selección
-        selected_action = Menu.select_difficulty()
+        # Mostrar menú y obtener selección; se ofrece continuar si la última partida quedó a medias
+        resume_path = sesiones.latest_unfinished(SESSION_FOLDER)
+        selected_action = Menu.select_difficulty(resume_path is not None)
         
         # Si se selecciona salir, terminar el programa
         if selected_action == "EXIT":
             break
-            
-        # Si se selecciona una dificultad, iniciar el juego
-        Game.run_game(selected_action)
+
+        # Continuar la última partida o iniciar una nueva con la dificultad seleccionada
+        if selected_action == "CONTINUE":
+            Game.run_game(None, resume_path)
+        else:
+            Game.run_game(selected_action)
     
     cv2.destroyAllWindows()
 
@@ -0,0 +1,271 @@
+# MIT License
+# Copyright (c) 2024 Raúl Martín-Romo Sánchez
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+# Jugadores automáticos y cálculo exacto del número esperado de movimientos.
+# Los jugadores juegan contra un Motor (el mismo tablero que crea Tablero.create_board) y deciden cada
+# volteo en tiempo constante, así que caben en un fotograma aunque el tablero sea grande.
+#
+# Uso: python jugadores.py             (par de cada dificultad)
+#      python jugadores.py --partidas 200 --memoria 6
+
+import argparse
+import random
+import numpy as np
+from collections import OrderedDict
+
+import motor
+from motor import DIFFICULTY_SETTINGS
+
+# Estrategias del solver para la segunda carta cuando la primera es nueva
+GREEDY = 'voraz'     # siempre probar otra carta desconocida
+OPTIMAL = 'optima'   # probar una desconocida o levantar una conocida, lo que dé menos movimientos esperados
+
+# Función para calcular los movimientos esperados con memoria perfecta para hasta max_pairs parejas.
+# Trabaja con estados abstractos (n parejas sin descubrir, k de ellas con una carta ya vista) en lugar
+# de tableros concretos. Devuelve (expected, known_second): expected[n, k] son los movimientos esperados
+# y known_second[n, k] indica si, con la primera carta nueva, conviene levantar una carta conocida
+def solve(max_pairs, strategy=OPTIMAL):
+    expected = np.zeros((max_pairs + 1, max_pairs + 2))
+    known_second = np.zeros((max_pairs + 1, max_pairs + 2), dtype=bool)
+
+    for n in range(1, max_pairs + 1):
+        # E(n, k) depende de E(n - 1, ·) y de E(n, k + 1), E(n, k + 2): se recorre k de mayor a menor
+        for k in range(n, -1, -1):
+            unknown = 2 * n - k
+            # La primera carta desconocida es pareja de una conocida: se descubre la pareja
+            value = k / unknown * (1 + expected[n - 1, k - 1]) if k else 0.0
+            if unknown > k:
+                # La primera carta es nueva. Segunda carta desconocida:
+                #   su pareja (1 movimiento), pareja de otra conocida (2 movimientos) o nueva
+                rest = unknown - 1
+                try_unknown = (1 / rest * (1 + expected[n - 1, k])
+                               + k / rest * (2 + expected[n - 1, k]))
+                if unknown - 2 - k > 0:
+                    try_unknown += (unknown - 2 - k) / rest * (1 + expected[n, k + 2])
+                # Segunda carta conocida: no se arriesga a mostrar otra carta nueva
+                try_known = 1 + expected[n, k + 1] if k and strategy == OPTIMAL else np.inf
+                known_second[n, k] = try_known < try_unknown
+                value += (unknown - k) / unknown * min(try_unknown, try_known)
+            expected[n, k] = value
+    return expected, known_second
+
+_solutions = {}
+
+# Función para obtener los movimientos esperados (par) de un tablero de num_pairs parejas
+def par(num_pairs, strategy=OPTIMAL):
+    expected, _ = _solution(num_pairs, strategy)
+    return float(expected[num_pairs, 0])
+
+# Función para obtener la tabla del solver, reutilizándola si ya se calculó para un tablero mayor
+def _solution(num_pairs, strategy):
+    cached = _solutions.get(strategy)
+    if cached is None or cached[0].shape[0] <= num_pairs:
+        cached = _solutions[strategy] = solve(max(num_pairs, 1), strategy)
+    return cached
+
+class ConjuntoIndexado:
+    # Conjunto con inserción, borrado y elección al azar en O(1)
+    def __init__(self, items=()):
+        self.items = []
+        self.positions = {}
+        for item in items:
+            self.add(item)
+
+    def add(self, item):
+        if item not in self.positions:
+            self.positions[item] = len(self.items)
+            self.items.append(item)
+
+    def discard(self, item):
+        index = self.positions.pop(item, None)
+        if index is None:
+            return
+        last = self.items.pop()
+        if index < len(self.items):
+            self.items[index] = last
+            self.positions[last] = index
+
+    def choice(self, rng, exclude=None):
+        if not self.items:
+            return None
+        item = self.items[rng.randrange(len(self.items))]
+        if item == exclude:
+            if len(self.items) == 1:
+                return None
+            index = (self.positions[item] + 1 + rng.randrange(len(self.items) - 1)) % len(self.items)
+            item = self.items[index]
+        return item
+
+    def __contains__(self, item):
+        return item in self.positions
+
+    def __len__(self):
+        return len(self.items)
+
+class JugadorMemoria:
+    # Jugador que recuerda las últimas `capacity` cartas vistas (todas si capacity es None).
+    # Con memoria perfecta es el jugador voraz; con optimal=True sigue además la estrategia del solver
+    # para decidir si la segunda carta es una desconocida o una ya conocida.
+    name = 'memoria'
+
+    def __init__(self, capacity=None, seed=None, optimal=False):
+        self.capacity = capacity
+        self.optimal = optimal
+        self.rng = random.Random(seed)
+        self.engine = None
+
+    # Prepara al jugador para una partida
+    def reset(self, engine):
+        self.engine = engine
+        self.memory = OrderedDict()  # posición -> valor, de la más antigua a la más reciente
+        self.by_value = {}           # valor -> posiciones recordadas boca abajo o levantadas ahora
+        self.pairs = {}              # valores con dos posiciones recordadas (dict para mantener el orden)
+        self.singles = 0             # valores con una sola posición recordada
+        down = zip(*np.nonzero(~engine.flipped))
+        self.unknown = ConjuntoIndexado((int(row), int(col)) for row, col in down)
+        if self.optimal:
+            self.known_second = _solution(engine.num_pairs, OPTIMAL)[1]
+
+    def _count(self, value, delta):
+        positions = self.by_value.get(value, ())
+        size = len(positions)
+        self.singles += (size == 1) - (size - delta == 1)
+        if size >= 2:
+            self.pairs[value] = None
+        else:
+            self.pairs.pop(value, None)
+
+    def _remember(self, card):
+        if card in self.memory:
+            self.memory.move_to_end(card)
+            return
+        value = self.engine.board[card]
+        self.memory[card] = value
+        self.by_value.setdefault(value, set()).add(card)
+        self._count(value, 1)
+        self.unknown.discard(card)
+        if self.capacity is not None and len(self.memory) > self.capacity:
+            # La carta más antigua se olvida y vuelve a ser desconocida si sigue en juego
+            oldest = next(iter(self.memory))
+            self._forget(oldest)
+            if not self.engine.flipped[oldest]:
+                self.unknown.add(oldest)
+
+    def _forget(self, card):
+        value = self.memory.pop(card, None)
+        if value is None:
+            return
+        positions = self.by_value[value]
+        positions.discard(card)
+        self._count(value, -1)
+        if not positions:
+            del self.by_value[value]
+
+    # Actualiza la memoria con los eventos que ha devuelto el motor (de cualquier jugador)
+    def observe(self, events):
+        for event in events:
+            kind = event[0]
+            if kind == motor.FLIP:
+                self._remember(event[1])
+            elif kind == motor.MATCH:
+                for card in event[1:]:
+                    self._forget(card)
+                    self.unknown.discard(card)
+            elif kind == motor.HIDE:
+                # Las cartas olvidadas mientras estaban boca arriba vuelven a las desconocidas
+                for card in event[1:]:
+                    if card not in self.memory:
+                        self.unknown.add(card)
+
+    # Una carta recordada que se puede levantar, distinta de `exclude`
+    def _remembered(self, value, exclude=None):
+        for card in self.by_value.get(value, ()):
+            if card != exclude and self.engine.can_flip(*card):
+                return card
+        return None
+
+    # Elige la siguiente acción: ('flip', fila, columna)
+    def choose(self):
+        engine = self.engine
+        first = engine.first_card
+        if engine.pending is not None:
+            # El motor oculta el fallo pendiente al voltear la siguiente carta
+            return (motor.HIDE,)
+
+        if first is None:
+            # Una pareja conocida se levanta directamente; si no, se prueba una carta desconocida
+            for value in self.pairs:
+                card = self._remembered(value)
+                if card is not None:
+                    return (motor.FLIP,) + card
+            card = self.unknown.choice(self.rng)
+        else:
+            value = engine.board[first]
+            card = self._remembered(value, first)
+            if card is None and self.optimal and self.singles > 1:
+                remaining = engine.num_pairs - engine.pairs_found
+                if self.known_second[remaining, self.singles - 1]:
+                    card = next((other for other in self.memory if other != first and engine.can_flip(*other)),
+                                None)
+            if card is None:
+                card = self.unknown.choice(self.rng, exclude=first)
+
+        if card is None:
+            # Sin cartas desconocidas (memoria muy corta): cualquier carta boca abajo
+            down = list(zip(*np.nonzero(~engine.flipped)))
+            card = tuple(int(v) for v in self.rng.choice(down))
+        return (motor.FLIP,) + card
+
+# Función para jugar una partida completa con un jugador; devuelve los movimientos hasta ganar
+def play_game(engine, player, max_moves=None):
+    player.reset(engine)
+    while not engine.is_won() and (max_moves is None or engine.moves < max_moves):
+        player.observe(engine.step(player.choose()))
+    return engine.moves
+
+def main():
+    parser = argparse.ArgumentParser(description='Par y jugadores automáticos de Emparejados')
+    parser.add_argument('--partidas', type=int, default=0, help='partidas por jugador para comparar con el par')
+    parser.add_argument('--memoria', type=int, default=6, help='cartas que recuerda el jugador olvidadizo')
+    parser.add_argument('--seed', type=int, default=None)
+    args = parser.parse_args()
+
+    print(f"{'Dificultad':<10} {'parejas':>7} {'par':>8} {'voraz':>8}")
+    for difficulty, (rows, cols) in DIFFICULTY_SETTINGS.items():
+        num_pairs = rows * cols // 2
+        print(f"{difficulty:<10} {num_pairs:>7} {par(num_pairs):>8.2f} {par(num_pairs, GREEDY):>8.2f}")
+
+    if args.partidas:
+        players = [JugadorMemoria(seed=args.seed), JugadorMemoria(seed=args.seed, optimal=True),
+                   JugadorMemoria(args.memoria, seed=args.seed)]
+        names = ['voraz', 'optimo', f'memoria {args.memoria}']
+        print(f"\n{'Dificultad':<10} " + ' '.join(f'{name:>10}' for name in names))
+        for difficulty, (rows, cols) in DIFFICULTY_SETTINGS.items():
+            means = []
+            for player in players:
+                rng = random.Random(args.seed)
+                moves = [play_game(motor.Motor(rows, cols, seed=rng.randrange(2 ** 31)), player)
+                         for _ in range(args.partidas)]
+                means.append(sum(moves) / len(moves))
+            print(f"{difficulty:<10} " + ' '.join(f'{mean:>10.2f}' for mean in means))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,193 @@
+# MIT License
+# Copyright (c) 2024 Raúl Martín-Romo Sánchez
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+# Motor del juego sin ventana: estado del tablero, parejas, pistas y victoria.
+# No dibuja ni espera, así que puede usarse para simular partidas sin pantalla.
+
+import random
+import numpy as np
+
+# Dimensiones del tablero por dificultad
+DIFFICULTY_SETTINGS = {
+    'Facil': (3, 2),   # 3x2
+    'Medio': (4, 4),   # 4x4
+    'Dificil': (4, 8), # 6x6
+    'Experto': (5, 12),  # 8x8
+    'Torneo': (10, 20)  # 200 cartas
+}
+
+# Acciones que acepta Motor.step
+FLIP = 'flip'   # ('flip', fila, columna)
+HIDE = 'hide'   # ('hide',) oculta la pareja fallida pendiente
+HINT = 'hint'   # ('hint',) o ('hint', estrategia) pide una pareja sin descubrir
+
+# Eventos que devuelve Motor.step
+MATCH = 'match'
+MISMATCH = 'mismatch'
+WIN = 'win'
+
+# Función para crear el tablero: matriz con el índice de pareja de cada carta
+# Con num_values menor que el número de parejas, los valores se repiten en varias parejas
+def create_board(rows, cols, rng=random, num_values=None):
+    num_pairs = (rows * cols) // 2
+    if num_values is None:
+        num_values = num_pairs
+    card_indices = [pair % num_values for pair in range(num_pairs)] * 2
+    rng.shuffle(card_indices)
+    return np.array(card_indices).reshape((rows, cols))
+
+# Estrategias de pista de IndiceParejas.hint
+HINT_ANY = 'cualquiera'  # cualquier pareja boca abajo
+HINT_SEEN = 'vista'      # preferir una pareja con alguna carta que el jugador ya ha visto
+
+class IndiceParejas:
+    # Índice incremental de las cartas boca abajo por valor de pareja, para dar pistas en O(1).
+    # Hay que avisarle cada vez que una carta cambia de cara (card_up / card_down).
+    def __init__(self, board, flipped=None):
+        self.board = board
+        self.down = {}           # valor -> posiciones boca abajo
+        self.complete = {}       # valores con las dos cartas boca abajo (dict para mantener el orden)
+        self.complete_seen = {}  # de los anteriores, los que tienen alguna carta ya vista
+        self.seen = set()
+
+        rows, cols = board.shape
+        for i in range(rows):
+            for j in range(cols):
+                if flipped is None or not flipped[i, j]:
+                    self.card_down((i, j))
+
+    # La carta queda boca abajo (al empezar o al ocultar un fallo)
+    def card_down(self, card):
+        value = self.board[card]
+        positions = self.down.setdefault(value, [])
+        positions.append(card)
+        if len(positions) >= 2:
+            self.complete[value] = None
+            if any(position in self.seen for position in positions):
+                self.complete_seen[value] = None
+
+    # La carta queda boca arriba; cuenta como vista a partir de ahora
+    def card_up(self, card):
+        value = self.board[card]
+        positions = self.down[value]
+        positions.remove(card)
+        self.seen.add(card)
+        if len(positions) < 2:
+            self.complete.pop(value, None)
+            self.complete_seen.pop(value, None)
+        elif not any(position in self.seen for position in positions):
+            self.complete_seen.pop(value, None)
+
+    # Posiciones boca abajo de un valor de pareja
+    def positions(self, value):
+        return self.down.get(value, [])
+
+    # Devuelve una pareja boca abajo según la estrategia, o (None, None) si no queda ninguna
+    def hint(self, strategy=HINT_ANY):
+        values = self.complete
+        if strategy == HINT_SEEN and self.complete_seen:
+            values = self.complete_seen
+        if not values:
+            return None, None
+        positions = self.down[next(iter(values))]
+        if values is self.complete_seen:
+            # Empezar por una carta vista (si hay cartas repetidas puede no ser la primera)
+            positions = sorted(positions, key=lambda position: position not in self.seen)
+        return positions[0], positions[1]
+
+class Motor:
+    # Estado completo de una partida
+    # flipped permite empezar con parejas ya descubiertas (por ejemplo al cargar una sesión)
+    def __init__(self, rows, cols, seed=None, board=None, flipped=None):
+        self.rows, self.cols = rows, cols
+        self.seed = seed
+        self.rng = random.Random(seed)
+        self.board = create_board(rows, cols, self.rng) if board is None else np.asarray(board)
+        self.flipped = np.zeros((rows, cols), dtype=bool) if flipped is None else np.asarray(flipped, dtype=bool)
+        self.num_pairs = (rows * cols) // 2
+        self.pair_index = IndiceParejas(self.board, self.flipped)
+
+        self.first_card = None
+        self.pending = None  # Pareja fallida que sigue boca arriba hasta que se oculte
+        self.pairs_found = int(self.flipped.sum()) // 2
+        self.moves = 0
+        self.hints = 0
+
+    # Se puede voltear una carta si está dentro del tablero, boca abajo y no hay un fallo pendiente
+    def can_flip(self, row, col):
+        return (self.pending is None and 0 <= row < self.rows and 0 <= col < self.cols
+                and not self.flipped[row, col])
+
+    def is_won(self):
+        return self.pairs_found == self.num_pairs
+
+    # Aplica una acción y devuelve la lista de eventos que ha producido
+    def step(self, action):
+        kind = action[0]
+        if kind == FLIP:
+            return self._flip(action[1], action[2])
+        if kind == HIDE:
+            return self._hide()
+        if kind == HINT:
+            strategy = action[1] if len(action) > 1 else HINT_ANY
+            card1, card2 = self.pair_index.hint(strategy)
+            if card1 is None:
+                return []
+            self.hints += 1
+            return [(HINT, card1, card2)]
+        raise ValueError(f"Acción desconocida: {kind}")
+
+    def _hide(self):
+        if self.pending is None:
+            return []
+        card1, card2 = self.pending
+        self.flipped[card1] = False
+        self.flipped[card2] = False
+        self.pair_index.card_down(card1)
+        self.pair_index.card_down(card2)
+        self.pending = None
+        return [(HIDE, card1, card2)]
+
+    def _flip(self, row, col):
+        # Sin pantalla no hay animación que espere: voltear otra carta oculta antes el fallo pendiente
+        events = self._hide()
+        if not self.can_flip(row, col):
+            return events
+
+        card = (row, col)
+        self.flipped[card] = True
+        self.pair_index.card_up(card)
+        events.append((FLIP, card))
+        if self.first_card is None:
+            self.first_card = card
+            return events
+
+        first_card, self.first_card = self.first_card, None
+        self.moves += 1
+        if self.board[first_card] == self.board[card]:
+            self.pairs_found += 1
+            events.append((MATCH, first_card, card))
+            if self.is_won():
+                events.append((WIN,))
+        else:
+            self.pending = (first_card, card)
+            events.append((MISMATCH, first_card, card))
+        return events
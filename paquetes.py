@@ -0,0 +1,218 @@
+# MIT License
+# Copyright (c) 2024 Raúl Martín-Romo Sánchez
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+# Paquetes de cartas: una carpeta con index.json o un único .zip con las imágenes y su índice.
+# Las caras se decodifican solo cuando se piden (las que salen en el tablero), en un grupo de hilos,
+# y se guardan en una caché LRU limitada en bytes; así un paquete de miles de imágenes no se carga entero.
+#
+# index.json: {"nombre": "Clásico", "cartas": ["perro.png", "gato.png", ...]}
+# Sin index.json se usan todas las imágenes de la carpeta (o del .zip) en orden alfabético.
+#
+# Uso: python paquetes.py imagenes/cartas --zip cartas.zip --nombre Clasico
+
+import argparse
+import concurrent.futures
+import json
+import os
+import threading
+import zipfile
+from collections import OrderedDict
+
+import cv2
+import numpy as np
+
+INDEX_NAME = 'index.json'
+IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg', '.bmp', '.webp')
+FACE_CACHE_BYTES = 256 * 1024 * 1024
+DECODE_WORKERS = min(8, os.cpu_count() or 1)
+
+class CacheLRU:
+    # Caché limitada por el tamaño total en bytes; se descartan las entradas menos usadas.
+    # Por defecto el tamaño de una entrada es el de la imagen (nbytes); si no es una imagen se indica al guardarla
+    def __init__(self, max_bytes=FACE_CACHE_BYTES):
+        self.max_bytes = max_bytes
+        self.size = 0
+        self.entries = OrderedDict()  # clave -> (valor, bytes)
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            self.entries.move_to_end(key)
+            return entry[0]
+
+    def put(self, key, value, nbytes=None):
+        with self.lock:
+            if key in self.entries:
+                return
+            nbytes = value.nbytes if nbytes is None else nbytes
+            self.entries[key] = (value, nbytes)
+            self.size += nbytes
+            while self.size > self.max_bytes and len(self.entries) > 1:
+                _, (_, oldest_bytes) = self.entries.popitem(last=False)
+                self.size -= oldest_bytes
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.size = 0
+
+# Caché de caras compartida por todos los paquetes: (paquete, nombre, tamaño) -> imagen
+face_cache = CacheLRU()
+
+_decoder = None
+_decoder_lock = threading.Lock()
+
+# Función para obtener el grupo de hilos de decodificación (se crea la primera vez)
+def decoder_pool():
+    global _decoder
+    with _decoder_lock:
+        if _decoder is None:
+            _decoder = concurrent.futures.ThreadPoolExecutor(DECODE_WORKERS, thread_name_prefix='decodificador')
+        return _decoder
+
+def is_image(name):
+    return name.lower().endswith(IMAGE_EXTENSIONS)
+
+class PaqueteCartas:
+    # Paquete abierto: solo lee el índice; las imágenes se leen y decodifican al pedirlas
+    def __init__(self, path):
+        self.path = os.path.abspath(path)
+        self.lock = threading.Lock()
+        if os.path.isdir(path):
+            self.archive = None
+            members = os.listdir(path)
+        elif zipfile.is_zipfile(path):
+            self.archive = zipfile.ZipFile(path)
+            members = self.archive.namelist()
+        else:
+            raise ValueError(f"{path} no es un paquete de cartas (carpeta o .zip)")
+
+        index = json.loads(self.read(INDEX_NAME)) if INDEX_NAME in members else {}
+        self.name = index.get('nombre', os.path.splitext(os.path.basename(self.path))[0])
+        self.names = index.get('cartas') or sorted(name for name in members if is_image(name))
+
+    def __len__(self):
+        return len(self.names)
+
+    # Función para leer los bytes de un fichero del paquete
+    def read(self, name):
+        if self.archive is None:
+            with open(os.path.join(self.path, name), 'rb') as image_file:
+                return image_file.read()
+        with self.lock:
+            return self.archive.read(name)
+
+    # Función para obtener la cara `index` decodificada al tamaño indicado; None si no se puede leer
+    def face(self, index, size):
+        key = (self.path, self.names[index], size)
+        image = face_cache.get(key)
+        if image is not None:
+            return image
+        try:
+            data = self.read(self.names[index])
+        except (OSError, KeyError):
+            return None
+        image = cv2.imdecode(np.frombuffer(data, dtype=np.uint8), cv2.IMREAD_COLOR)
+        if image is None:
+            return None
+        image = cv2.resize(image, size)
+        # Las caras se comparten entre partidas, así que nadie debe modificarlas
+        image.flags.writeable = False
+        face_cache.put(key, image)
+        return image
+
+    # Función para decodificar varias caras en paralelo; las que no se pueden leer quedan como None
+    def faces(self, indices, size):
+        return list(decoder_pool().map(lambda index: self.face(index, size), indices))
+
+    # Función para elegir `count` caras al azar y decodificar solo esas
+    # Las que no se pueden leer se avisan y se sustituyen por otras del paquete
+    def sample_faces(self, rng, count, size):
+        count = min(count, len(self))
+        selection = rng.sample(range(len(self)), count)
+        faces = self.faces(selection, size)
+        tried = set(selection)
+        while any(face is None for face in faces):
+            for position, face in enumerate(faces):
+                if face is None:
+                    print(f"Aviso: no se puede leer la carta {self.names[selection[position]]} de {self.name}")
+            remaining = [index for index in range(len(self)) if index not in tried]
+            missing = [position for position, face in enumerate(faces) if face is None]
+            if not remaining:
+                # No quedan más caras: el tablero usará las que sí se han podido leer
+                selection = [index for index, face in zip(selection, faces) if face is not None]
+                faces = [face for face in faces if face is not None]
+                break
+            replacements = rng.sample(remaining, min(len(missing), len(remaining)))
+            tried.update(replacements)
+            for position, index, face in zip(missing, replacements, self.faces(replacements, size)):
+                selection[position], faces[position] = index, face
+        return selection, faces
+
+_packs = {}
+
+# Función para abrir un paquete, reutilizándolo mientras no cambie en disco
+def open_pack(path):
+    key = os.path.abspath(path)
+    mtime = os.path.getmtime(path)
+    entry = _packs.get(key)
+    if entry is None or entry[0] != mtime:
+        entry = _packs[key] = (mtime, PaqueteCartas(path))
+    return entry[1]
+
+# Función para crear un paquete a partir de una carpeta de imágenes: escribe su index.json o,
+# si se indica zip_path, un único .zip con las imágenes y el índice. Las imágenes ilegibles se omiten.
+def create_pack(folder, zip_path=None, name=None):
+    names = []
+    for filename in sorted(os.listdir(folder)):
+        if is_image(filename) and cv2.imread(os.path.join(folder, filename)) is not None:
+            names.append(filename)
+        elif is_image(filename):
+            print(f"Aviso: se omite {filename}, no se puede leer")
+    index = json.dumps({'nombre': name or os.path.basename(os.path.normpath(folder)), 'cartas': names},
+                       ensure_ascii=False, indent=2)
+
+    if zip_path is None:
+        with open(os.path.join(folder, INDEX_NAME), 'w', encoding='utf-8') as index_file:
+            index_file.write(index)
+        return names
+
+    # Las imágenes ya están comprimidas: se guardan sin volver a comprimir
+    with zipfile.ZipFile(zip_path, 'w', zipfile.ZIP_STORED) as archive:
+        archive.writestr(INDEX_NAME, index)
+        for filename in names:
+            archive.write(os.path.join(folder, filename), filename)
+    return names
+
+def main():
+    parser = argparse.ArgumentParser(description='Crear un paquete de cartas de Emparejados')
+    parser.add_argument('carpeta', help='carpeta con las imágenes de las cartas')
+    parser.add_argument('--zip', default=None, help='crear un .zip en lugar de escribir index.json en la carpeta')
+    parser.add_argument('--nombre', default=None, help='nombre del paquete')
+    args = parser.parse_args()
+    names = create_pack(args.carpeta, args.zip, args.nombre)
+    print(f"Paquete con {len(names)} cartas en {args.zip or os.path.join(args.carpeta, INDEX_NAME)}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,355 @@
+# MIT License
+# Copyright (c) 2024 Raúl Martín-Romo Sánchez
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+# Servidor de partidas multijugador por turnos con asyncio, sobre TCP o un socket Unix.
+# Cada partida tiene su propio Motor; un proceso atiende cientos de mesas a la vez.
+#
+# Protocolo: cada mensaje es una cabecera HEADER_FORMAT (tipo, longitud) seguida de su carga, empaquetada
+# con el formato de MESSAGE_FORMATS. El tablero no se envía: el servidor anuncia el valor de cada carta al
+# voltearla, así que ningún cliente puede saber dónde están las parejas.
+#
+# Reglas por turnos: el jugador en turno voltea dos cartas; si son pareja suma un punto y repite, si no,
+# las cartas se ocultan y el turno pasa al siguiente.
+#
+# Uso: python servidor.py --puerto 5555
+#      python servidor.py --unix /tmp/emparejados.sock
+#      python servidor.py --prueba 200   (partidas con clientes locales aleatorios)
+
+import argparse
+import asyncio
+import itertools
+import os
+import random
+import struct
+import tempfile
+import time
+
+import motor
+
+HEADER_FORMAT = '<BH'
+HEADER_SIZE = struct.calcsize(HEADER_FORMAT)
+
+# Mensajes del cliente
+CREATE = 1    # filas, columnas, jugadores
+JOIN = 2      # partida
+FLIP = 3      # fila, columna
+LEAVE = 4
+
+# Mensajes del servidor
+JOINED = 10    # partida, asiento, filas, columnas, jugadores
+START = 11     # asiento con el primer turno
+FLIPPED = 12   # asiento, fila, columna, valor
+MATCH = 13     # asiento, fila1, columna1, fila2, columna2, puntos del asiento
+MISMATCH = 14  # asiento, fila1, columna1, fila2, columna2 (las cartas se ocultan)
+TURN = 15      # asiento en turno
+END = 16       # ganador (NO_WINNER si hay empate o se abandona) y los puntos de cada asiento
+ERROR = 17     # código de error
+
+MESSAGE_FORMATS = {
+    CREATE: '<BBB',
+    JOIN: '<I',
+    FLIP: '<BB',
+    LEAVE: '<',
+    JOINED: '<IBBBB',
+    START: '<B',
+    FLIPPED: '<BBBH',
+    MATCH: '<BBBBBH',
+    MISMATCH: '<BBBBB',
+    TURN: '<B',
+    END: '<B',  # seguido de un uint16 de puntos por asiento
+    ERROR: '<B',
+}
+
+# Códigos de error
+ERROR_NO_MATCH = 1
+ERROR_FULL = 2
+ERROR_NOT_YOUR_TURN = 3
+ERROR_INVALID = 4
+ERROR_NOT_STARTED = 5
+
+NO_WINNER = 255
+MAX_SEATS = 8
+MAX_SIDE = 20
+MAX_WRITE_BUFFER = 256 * 1024  # un cliente que no lee más que esto se desconecta
+BACKLOG = 1024  # conexiones pendientes de aceptar: en un local se conectan muchas mesas a la vez
+
+# Función para empaquetar un mensaje
+def encode(kind, *values):
+    if kind == END:
+        payload = struct.pack(f'<B{len(values) - 1}H', *values)
+    else:
+        payload = struct.pack(MESSAGE_FORMATS[kind], *values)
+    return struct.pack(HEADER_FORMAT, kind, len(payload)) + payload
+
+# Función para desempaquetar la carga de un mensaje
+def decode(kind, payload):
+    if kind == END:
+        return struct.unpack(f'<B{(len(payload) - 1) // 2}H', payload)
+    return struct.unpack(MESSAGE_FORMATS[kind], payload)
+
+# Función para leer un mensaje completo de un stream: (tipo, valores)
+async def read_message(reader):
+    kind, length = struct.unpack(HEADER_FORMAT, await reader.readexactly(HEADER_SIZE))
+    payload = await reader.readexactly(length) if length else b''
+    if kind not in MESSAGE_FORMATS:
+        raise ValueError(f"Mensaje desconocido: {kind}")
+    return kind, decode(kind, payload)
+
+class Partida:
+    # Estado de una partida: motor, jugadores conectados, puntos y turno
+    def __init__(self, match_id, rows, cols, seats, seed=None):
+        self.id = match_id
+        self.rows, self.cols, self.seats = rows, cols, seats
+        self.engine = motor.Motor(rows, cols, seed=seed)
+        self.writers = []
+        self.scores = [0] * seats
+        self.turn = 0
+        self.started = False
+        self.finished = False
+
+    # Añade un jugador y devuelve su asiento, o None si la partida está completa
+    def join(self, writer):
+        if len(self.writers) >= self.seats or self.started:
+            return None
+        self.writers.append(writer)
+        return len(self.writers) - 1
+
+    # Envía un mensaje a todos los jugadores de la partida
+    def broadcast(self, message):
+        for writer in self.writers:
+            if writer.transport.get_write_buffer_size() > MAX_WRITE_BUFFER:
+                writer.close()
+            elif not writer.is_closing():
+                writer.write(message)
+
+    def winner(self):
+        best = max(self.scores)
+        return self.scores.index(best) if self.scores.count(best) == 1 else NO_WINNER
+
+    # Aplica el volteo de un jugador; devuelve los mensajes para todos o un código de error
+    def flip(self, seat, row, col):
+        if not self.started or self.finished:
+            return ERROR_NOT_STARTED
+        if seat != self.turn:
+            return ERROR_NOT_YOUR_TURN
+        if not self.engine.can_flip(row, col):
+            return ERROR_INVALID
+
+        messages = []
+        for event in self.engine.step((motor.FLIP, row, col)):
+            kind = event[0]
+            if kind == motor.FLIP:
+                card = event[1]
+                messages.append(encode(FLIPPED, seat, card[0], card[1], int(self.engine.board[card])))
+            elif kind == motor.MATCH:
+                self.scores[seat] += 1
+                (row1, col1), (row2, col2) = event[1:]
+                messages.append(encode(MATCH, seat, row1, col1, row2, col2, self.scores[seat]))
+            elif kind == motor.MISMATCH:
+                # Sin animaciones que esperar: el fallo se oculta ya y el turno pasa al siguiente
+                (row1, col1), (row2, col2) = event[1:]
+                messages.append(encode(MISMATCH, seat, row1, col1, row2, col2))
+                self.engine.step((motor.HIDE,))
+                self.turn = (self.turn + 1) % self.seats
+                messages.append(encode(TURN, self.turn))
+            elif kind == motor.WIN:
+                self.finished = True
+                messages.append(encode(END, self.winner(), *self.scores))
+        return messages
+
+class Servidor:
+    # Todas las partidas en curso, indexadas por su identificador
+    def __init__(self, seed=None):
+        self.matches = {}
+        self.ids = itertools.count(1)
+        self.rng = random.Random(seed)
+
+    def create_match(self, rows, cols, seats):
+        if not (1 <= seats <= MAX_SEATS and 1 <= rows <= MAX_SIDE and 1 <= cols <= MAX_SIDE
+                and rows * cols % 2 == 0):
+            return None
+        match = Partida(next(self.ids), rows, cols, seats, self.rng.randrange(2 ** 31))
+        self.matches[match.id] = match
+        return match
+
+    # Atiende a un cliente: se une a una partida, juega y sale
+    async def handle_client(self, reader, writer):
+        match = seat = None
+        try:
+            while True:
+                kind, values = await read_message(reader)
+                if kind in (CREATE, JOIN) and match is None:
+                    match = self.create_match(*values) if kind == CREATE else self.matches.get(values[0])
+                    if match is None:
+                        writer.write(encode(ERROR, ERROR_INVALID if kind == CREATE else ERROR_NO_MATCH))
+                        continue
+                    seat = match.join(writer)
+                    if seat is None:
+                        match = None
+                        writer.write(encode(ERROR, ERROR_FULL))
+                        continue
+                    writer.write(encode(JOINED, match.id, seat, match.rows, match.cols, match.seats))
+                    if len(match.writers) == match.seats:
+                        match.started = True
+                        match.broadcast(encode(START, match.turn))
+                elif kind == FLIP and match is not None:
+                    result = match.flip(seat, *values)
+                    if isinstance(result, int):
+                        writer.write(encode(ERROR, result))
+                    else:
+                        for message in result:
+                            match.broadcast(message)
+                        if match.finished:
+                            self.matches.pop(match.id, None)
+                elif kind == LEAVE:
+                    break
+                else:
+                    writer.write(encode(ERROR, ERROR_INVALID))
+                await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionError, ValueError, struct.error):
+            pass
+        finally:
+            # Si un jugador se va antes de acabar, la partida termina para todos
+            if match is not None and not match.finished:
+                match.finished = True
+                match.writers.remove(writer)
+                match.broadcast(encode(END, NO_WINNER, *match.scores))
+                self.matches.pop(match.id, None)
+            writer.close()
+
+    # Función para escuchar en TCP y/o en un socket Unix
+    async def start(self, host='127.0.0.1', port=None, path=None):
+        servers = []
+        if port is not None:
+            servers.append(await asyncio.start_server(self.handle_client, host, port, backlog=BACKLOG))
+        if path is not None:
+            servers.append(await asyncio.start_unix_server(self.handle_client, path, backlog=BACKLOG))
+        return servers
+
+class Cliente:
+    # Cliente del protocolo; la ventana de OpenCV o un jugador automático lo usan igual
+    def __init__(self, reader, writer):
+        self.reader, self.writer = reader, writer
+
+    async def connect(host='127.0.0.1', port=None, path=None):
+        if path is not None:
+            return Cliente(*await asyncio.open_unix_connection(path))
+        return Cliente(*await asyncio.open_connection(host, port))
+
+    async def send(self, kind, *values):
+        self.writer.write(encode(kind, *values))
+        await self.writer.drain()
+
+    async def create(self, rows, cols, seats):
+        await self.send(CREATE, rows, cols, seats)
+
+    async def join(self, match_id):
+        await self.send(JOIN, match_id)
+
+    async def flip(self, row, col):
+        await self.send(FLIP, row, col)
+
+    async def receive(self):
+        return await read_message(self.reader)
+
+    async def close(self):
+        self.writer.close()
+        await self.writer.wait_closed()
+
+# Jugador de prueba: recuerda los valores anunciados y voltea al azar las cartas que no conoce
+async def random_player(client, seat, rows, cols, rng):
+    down = {(row, col) for row in range(rows) for col in range(cols)}
+    values = {}
+    flipped = []
+    moves = 0
+    while True:
+        kind, message = await client.receive()
+        if kind == FLIPPED:
+            values[message[1:3]] = message[3]
+            flipped.append(message[1:3])
+        elif kind == MATCH:
+            down -= {message[1:3], message[3:5]}
+        elif kind == END:
+            return moves
+        if kind in (START, TURN, MATCH) and message[0] == seat and down:
+            flipped = []
+            moves += 1
+            first = rng.choice(sorted(down))
+            await client.flip(*first)
+        elif kind == FLIPPED and message[0] == seat and len(flipped) == 1:
+            # Segunda carta: su pareja si se conoce, si no, cualquier otra
+            first = flipped[0]
+            known = [card for card in down if card != first and values.get(card) == values[first]]
+            await client.flip(*(known[0] if known else rng.choice(sorted(down - {first}))))
+
+# Función para probar el servidor con partidas de clientes locales; devuelve el tiempo total
+async def loopback_test(matches, rows=4, cols=4, seats=2, path=None, seed=None):
+    server = Servidor(seed)
+    path = path or os.path.join(tempfile.mkdtemp(), 'emparejados.sock')
+    listeners = await server.start(path=path)
+    rng = random.Random(seed)
+
+    async def play_match():
+        host = await Cliente.connect(path=path)
+        await host.create(rows, cols, seats)
+        _, (match_id, *_) = await host.receive()
+        guests = [await Cliente.connect(path=path) for _ in range(seats - 1)]
+        for guest in guests:
+            await guest.join(match_id)
+            await guest.receive()
+        players = [host] + guests
+        await asyncio.gather(*(random_player(client, seat, rows, cols, rng) for seat, client in enumerate(players)))
+        for client in players:
+            await client.close()
+
+    start = time.perf_counter()
+    await asyncio.gather(*(play_match() for _ in range(matches)))
+    elapsed = time.perf_counter() - start
+    for listener in listeners:
+        listener.close()
+        await listener.wait_closed()
+    os.unlink(path)
+    return elapsed
+
+async def serve(host, port, path):
+    listeners = await Servidor().start(host, port, path)
+    print("Servidor escuchando en", ', '.join(str(sock.getsockname()) for listener in listeners
+                                                for sock in listener.sockets))
+    await asyncio.gather(*(listener.serve_forever() for listener in listeners))
+
+def main():
+    parser = argparse.ArgumentParser(description='Servidor de partidas multijugador de Emparejados')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--puerto', type=int, default=None, help='puerto TCP')
+    parser.add_argument('--unix', default=None, help='ruta del socket Unix')
+    parser.add_argument('--prueba', type=int, default=0, help='jugar N partidas con clientes locales y salir')
+    args = parser.parse_args()
+
+    if args.prueba:
+        elapsed = asyncio.run(loopback_test(args.prueba, path=args.unix))
+        print(f"{args.prueba} partidas en {elapsed:.2f} s")
+        return
+    if args.puerto is None and args.unix is None:
+        args.puerto = 5555
+    asyncio.run(serve(args.host, args.puerto, args.unix))
+
+if __name__ == "__main__":
+    main()
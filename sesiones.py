@@ -0,0 +1,231 @@
+# MIT License
+# Copyright (c) 2024 Raúl Martín-Romo Sánchez
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+# Sesiones de juego en un formato binario compacto, para continuar partidas y reproducirlas con el motor.
+#
+# Formato (little endian):
+#   cabecera   HEADER_FORMAT: 'EMPJ', versión, filas, columnas, bytes por valor, semilla, inicio (epoch s),
+#              número de caras
+#   tablero    filas * columnas valores de pareja (uint8 o uint16)
+#   caras      número de caras * uint16: índice de cada cara en la carpeta de imágenes
+#   volteadas  mapa de bits (np.packbits) de las cartas boca arriba al empezar
+#   eventos    registros EVENT_FORMAT hasta el final del fichero: ms desde el inicio, acción, fila, columna
+#
+# Solo se guardan las acciones del jugador; el resultado de cada una lo vuelve a calcular el motor al
+# reproducirlas. Los eventos se añaden al final, así que un registro cortado por un cierre brusco se ignora.
+
+import mmap
+import os
+import struct
+import time
+import numpy as np
+
+import motor
+
+MAGIC = b'EMPJ'
+VERSION = 1
+HEADER_FORMAT = '<4sBBBBqqH'
+HEADER_SIZE = struct.calcsize(HEADER_FORMAT)
+EVENT_FORMAT = '<IBBB'
+EVENT_SIZE = struct.calcsize(EVENT_FORMAT)
+EVENT_DTYPE = np.dtype([('time', '<u4'), ('action', 'u1'), ('row', 'u1'), ('col', 'u1')])
+
+SESSION_EXTENSION = '.emp'
+WRITE_BUFFER_SIZE = 64 * 1024
+
+# Códigos de acción y de estrategia de pista en el registro de eventos
+ACTION_CODES = {motor.FLIP: 1, motor.HIDE: 2, motor.HINT: 3}
+ACTIONS = {code: action for action, code in ACTION_CODES.items()}
+HINT_CODES = {motor.HINT_ANY: 0, motor.HINT_SEEN: 1}
+HINTS = {code: strategy for strategy, code in HINT_CODES.items()}
+
+# Función para convertir una acción del motor en (código, fila, columna)
+def encode_action(action):
+    kind = action[0]
+    if kind == motor.FLIP:
+        return ACTION_CODES[kind], action[1], action[2]
+    if kind == motor.HINT:
+        return ACTION_CODES[kind], HINT_CODES[action[1] if len(action) > 1 else motor.HINT_ANY], 0
+    return ACTION_CODES[kind], 0, 0
+
+# Función inversa de encode_action
+def decode_action(code, row, col):
+    kind = ACTIONS[code]
+    if kind == motor.FLIP:
+        return (kind, int(row), int(col))
+    if kind == motor.HINT:
+        return (kind, HINTS[row])
+    return (kind,)
+
+# Función para construir la cabecera, el tablero, las caras y el mapa de volteadas de una partida
+def encode_header(engine, selection, started=None):
+    value_size = 1 if engine.board.max() < 256 else 2
+    seed = -1 if engine.seed is None else engine.seed
+    started = int(time.time()) if started is None else started
+    header = struct.pack(HEADER_FORMAT, MAGIC, VERSION, engine.rows, engine.cols, value_size, seed, started,
+                         len(selection))
+    board = engine.board.astype('<u1' if value_size == 1 else '<u2')
+    return (header + board.tobytes() + np.asarray(selection, dtype='<u2').tobytes()
+            + np.packbits(engine.flipped).tobytes())
+
+class Sesion:
+    # Sesión cargada de disco con mmap; los eventos son una vista sobre el fichero sin copiarlo
+    def __init__(self, path):
+        self.path = path
+        with open(path, 'rb') as session_file:
+            self._mmap = mmap.mmap(session_file.fileno(), 0, access=mmap.ACCESS_READ)
+
+        if len(self._mmap) < HEADER_SIZE or self._mmap[:len(MAGIC)] != MAGIC:
+            self._mmap.close()
+            raise ValueError(f"{path} no es una sesión de Emparejados válida")
+        _, version, rows, cols, value_size, seed, started, num_faces = struct.unpack_from(HEADER_FORMAT,
+                                                                                          self._mmap)
+        if version != VERSION:
+            self._mmap.close()
+            raise ValueError(f"{path}: versión de sesión no soportada ({version})")
+        self.rows, self.cols = rows, cols
+        self.seed = None if seed < 0 else seed
+        self.started = started
+
+        offset = HEADER_SIZE
+        num_cards = rows * cols
+        self.board = np.frombuffer(self._mmap, '<u1' if value_size == 1 else '<u2', num_cards,
+                                   offset).reshape(rows, cols).astype(np.int64)
+        offset += num_cards * value_size
+        self.selection = np.frombuffer(self._mmap, '<u2', num_faces, offset).tolist()
+        offset += num_faces * 2
+        bitmap_size = (num_cards + 7) // 8
+        self.flipped = np.unpackbits(np.frombuffer(self._mmap, np.uint8, bitmap_size, offset),
+                                     count=num_cards).reshape(rows, cols).astype(bool)
+        offset += bitmap_size
+
+        # Un último registro incompleto (escritura interrumpida) se descarta
+        self.events_offset = offset
+        self.events = np.frombuffer(self._mmap, EVENT_DTYPE, (len(self._mmap) - offset) // EVENT_SIZE, offset)
+        self.events_end = offset + len(self.events) * EVENT_SIZE
+
+    # Duración registrada de la partida (ms hasta el último evento)
+    def duration(self):
+        return int(self.events['time'][-1]) if len(self.events) else 0
+
+    # Acciones del registro con su tiempo: (ms, acción)
+    def actions(self):
+        for event_time, code, row, col in self.events.tolist():
+            yield event_time, decode_action(code, row, col)
+
+    def close(self):
+        # Las vistas de numpy sobre el mmap tienen que desaparecer antes de cerrarlo
+        self.events = None
+        self._mmap.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+# Función para crear el motor en el estado inicial de la sesión
+def initial_engine(session):
+    return motor.Motor(session.rows, session.cols, seed=session.seed, board=session.board.copy(),
+                       flipped=session.flipped.copy())
+
+# Función para reproducir una sesión paso a paso: devuelve (ms, acción, eventos) de cada acción
+def replay_steps(session, engine=None):
+    engine = initial_engine(session) if engine is None else engine
+    for event_time, action in session.actions():
+        yield event_time, action, engine.step(action)
+
+# Función para reproducir una sesión completa y devolver el motor en su estado final
+def replay(session):
+    engine = initial_engine(session)
+    for _ in replay_steps(session, engine):
+        pass
+    return engine
+
+class RegistroSesion:
+    # Escritor de una sesión: solo añade registros al final del fichero. La cabecera y cada acción se
+    # vacían al disco en cuanto se escriben, para que tras un cierre brusco la partida se pueda continuar
+    # Al reabrir, size recorta el fichero tras el último registro completo para que los nuevos queden alineados
+    def __init__(self, path, offset_ms=0, header=None, size=None):
+        self.path = path
+        self.file = open(path, 'wb' if header is not None else 'ab', buffering=WRITE_BUFFER_SIZE)
+        if header is not None:
+            self.file.write(header)
+            self.file.flush()
+        if size is not None:
+            self.file.truncate(size)
+        # Los tiempos siguen desde el último evento, sin contar el tiempo que la partida ha estado cerrada
+        self.offset_ms = offset_ms
+        self.start = time.perf_counter()
+
+    # Función para empezar una sesión nueva con el estado inicial de la partida
+    def create(path, engine, selection):
+        return RegistroSesion(path, header=encode_header(engine, selection))
+
+    # Función para seguir escribiendo al final de una sesión ya cargada. El fichero se recorta, así que
+    # la sesión tiene que estar cerrada (no se puede recortar un fichero mapeado en todos los sistemas);
+    # offset_ms es su duración, leída antes de cerrarla
+    def reopen(session, offset_ms):
+        return RegistroSesion(session.path, offset_ms=offset_ms, size=session.events_end)
+
+    def elapsed_ms(self):
+        return self.offset_ms + int((time.perf_counter() - self.start) * 1000)
+
+    # Añade una acción del motor al registro
+    def log(self, action):
+        self.file.write(struct.pack(EVENT_FORMAT, self.elapsed_ms(), *encode_action(action)))
+        self.file.flush()
+
+    def flush(self):
+        self.file.flush()
+
+    def close(self):
+        self.file.close()
+
+# Función para generar el nombre de una sesión nueva
+def new_session_path(folder, difficulty):
+    os.makedirs(folder, exist_ok=True)
+    name = f"{time.strftime('%Y%m%d-%H%M%S')}_{difficulty}"
+    path = os.path.join(folder, name + SESSION_EXTENSION)
+    suffix = 1
+    while os.path.exists(path):
+        path = os.path.join(folder, f"{name}_{suffix}{SESSION_EXTENSION}")
+        suffix += 1
+    return path
+
+# Función para listar las sesiones de una carpeta, de la más antigua a la más reciente
+def session_paths(folder):
+    if not os.path.isdir(folder):
+        return []
+    paths = [os.path.join(folder, name) for name in os.listdir(folder) if name.endswith(SESSION_EXTENSION)]
+    return sorted(paths, key=os.path.getmtime)
+
+# Función para encontrar la última sesión si quedó sin terminar; devuelve su ruta o None
+def latest_unfinished(folder):
+    paths = session_paths(folder)
+    if not paths:
+        return None
+    try:
+        with Sesion(paths[-1]) as session:
+            won = replay(session).is_won()
+    except (ValueError, KeyError, OSError):
+        return None
+    return None if won else paths[-1]
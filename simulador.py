@@ -0,0 +1,222 @@
+# MIT License
+# Copyright (c) 2024 Raúl Martín-Romo Sánchez
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+# Simulador por lotes: avanza miles de tableros a la vez con operaciones vectorizadas de NumPy.
+# Sirve para calibrar la dificultad y la puntuación a partir de la distribución de movimientos.
+#
+# Uso: python simulador.py -n 10000 --seed 1 --memoria 6
+
+import argparse
+import numpy as np
+
+from motor import DIFFICULTY_SETTINGS
+
+# Función para elegir al azar, en cada fila, una de las posiciones marcadas en la máscara
+# Devuelve -1 en las filas que no tienen ninguna posición marcada
+def random_choice(rng, mask):
+    # Las posiciones marcadas reciben una clave en [1, 2) y el resto en [0, 1), así que la mayor
+    # clave de cada fila es una posición marcada elegida al azar
+    keys = rng.random(mask.shape, dtype=np.float32)
+    keys += mask
+    choice = keys.argmax(axis=1)
+    choice[~mask.any(axis=1)] = -1
+    return choice
+
+# Función para elegir en cada fila la primera opción válida de una lista de candidatas
+def first_valid(*choices):
+    result = choices[0].copy()
+    for choice in choices[1:]:
+        missing = result < 0
+        result[missing] = choice[missing]
+    return result
+
+class JugadorAleatorio:
+    # Voltea dos cartas cualesquiera sin recordar nada
+    name = 'aleatorio'
+
+    def choose_first(self, sim, rng):
+        return random_choice(rng, ~sim.matched)
+
+    def choose_second(self, sim, rng, first):
+        candidates = ~sim.matched
+        candidates[sim.index, first] = False
+        return random_choice(rng, candidates)
+
+class MemoriaLimitada:
+    # Recuerda solo las últimas `capacity` cartas que ha visto en su tablero
+    name = 'memoria_limitada'
+
+    def __init__(self, capacity):
+        self.capacity = capacity
+
+    # Máscara de cartas que el jugador recuerda y que siguen en juego
+    def known(self, sim):
+        remembered = (sim.seen_at >= 0) & (sim.reveals[:, None] - sim.seen_at <= self.capacity)
+        return remembered & ~sim.matched
+
+    # Si conoce las dos cartas de una pareja la levanta; si no, prueba una carta que no recuerda
+    def choose_first(self, sim, rng):
+        known = self.known(sim)
+        known_pair = known & known[sim.index[:, None], sim.partner]
+        unknown = ~known & ~sim.matched
+        return first_valid(random_choice(rng, known_pair), random_choice(rng, unknown),
+                           random_choice(rng, ~sim.matched))
+
+    # Si recuerda la pareja de la primera carta la levanta; si no, prueba otra carta que no recuerda
+    def choose_second(self, sim, rng, first):
+        known = self.known(sim)
+        partner = sim.partner[sim.index, first]
+        partner_choice = np.where(known[sim.index, partner], partner, -1)
+
+        unknown = ~known & ~sim.matched
+        unknown[sim.index, first] = False
+        candidates = ~sim.matched
+        candidates[sim.index, first] = False
+        return first_valid(partner_choice, random_choice(rng, unknown), random_choice(rng, candidates))
+
+class MemoriaPerfecta(MemoriaLimitada):
+    # Recuerda todas las cartas que ha visto
+    name = 'memoria_perfecta'
+
+    def __init__(self):
+        super().__init__(np.iinfo(np.int64).max)
+
+class SimuladorLotes:
+    # N tableros apilados: boards (N, filas, columnas) con el índice de pareja de cada carta.
+    # Las políticas trabajan sobre vistas planas (tableros en juego, cartas) de los tableros que
+    # aún no han terminado; los terminados se retiran para que no sigan costando en cada turno.
+    def __init__(self, rows, cols, n, seed=None, boards=None):
+        self.rows, self.cols, self.n = rows, cols, n
+        self.rng = np.random.default_rng(seed)
+        cells = rows * cols
+
+        if boards is None:
+            # Cada permutación de 0..cells-1 dividida entre dos da un tablero con cada pareja dos veces
+            boards = np.argsort(self.rng.random((n, cells)), axis=1) // 2
+        self.boards = np.asarray(boards).reshape((n, rows, cols))
+        self.moves = np.zeros(n, dtype=np.int64)
+        self.won = np.zeros(n, dtype=bool)
+
+        # Estado de los tableros en juego; ids indica a qué tablero original corresponde cada fila
+        self.ids = np.arange(n)
+        self.index = np.arange(n)
+        self.flat = self.boards.reshape((n, cells))
+        self.matched = np.zeros((n, cells), dtype=bool)
+        self.seen_at = np.full((n, cells), -1, dtype=np.int64)
+        self.reveals = np.zeros(n, dtype=np.int64)
+
+        # partner[b, c] es la otra posición con el mismo valor que c en el tablero b
+        order = np.argsort(self.flat, axis=1, kind='stable')
+        self.partner = np.empty_like(order)
+        self.partner[self.index[:, None], order[:, 0::2]] = order[:, 1::2]
+        self.partner[self.index[:, None], order[:, 1::2]] = order[:, 0::2]
+
+    # Máscara con forma de tablero de las cartas emparejadas de los tableros en juego
+    @property
+    def flipped(self):
+        return self.matched.reshape((-1, self.rows, self.cols))
+
+    def _reveal(self, cards):
+        self.seen_at[self.index, cards] = self.reveals
+        self.reveals += 1
+
+    # Retira los tableros terminados de las matrices de trabajo
+    def _compact(self, keep):
+        self.ids = self.ids[keep]
+        self.flat = self.flat[keep]
+        self.matched = self.matched[keep]
+        self.seen_at = self.seen_at[keep]
+        self.reveals = self.reveals[keep]
+        self.partner = self.partner[keep]
+        self.index = np.arange(len(self.ids))
+
+    # Un turno en todos los tableros en juego; devuelve si queda alguno
+    def step(self, policy):
+        if not len(self.ids):
+            return False
+
+        first = policy.choose_first(self, self.rng)
+        self._reveal(first)
+        second = policy.choose_second(self, self.rng, first)
+        self._reveal(second)
+
+        match = self.flat[self.index, first] == self.flat[self.index, second]
+        self.matched[self.index[match], first[match]] = True
+        self.matched[self.index[match], second[match]] = True
+        self.moves[self.ids] += 1
+
+        finished = self.matched.all(axis=1)
+        if finished.any():
+            self.won[self.ids[finished]] = True
+            self._compact(~finished)
+        return len(self.ids) > 0
+
+    # Juega hasta que terminan todos los tableros (o se alcanza max_moves) y devuelve los movimientos
+    def run(self, policy, max_moves=None):
+        if max_moves is None:
+            max_moves = 100 * self.rows * self.cols
+        for _ in range(max_moves):
+            if not self.step(policy):
+                break
+        return self.moves
+
+# Función para resumir una distribución de movimientos hasta ganar
+def summarize(moves):
+    percentiles = np.percentile(moves, [10, 50, 90])
+    return {
+        'media': float(moves.mean()),
+        'desviacion': float(moves.std()),
+        'minimo': int(moves.min()),
+        'p10': float(percentiles[0]),
+        'p50': float(percentiles[1]),
+        'p90': float(percentiles[2]),
+        'maximo': int(moves.max()),
+    }
+
+# Función para simular todas las dificultades con cada política
+def simulate_difficulties(policies, n, seed=None, difficulties=DIFFICULTY_SETTINGS):
+    results = {}
+    for offset, (difficulty, (rows, cols)) in enumerate(difficulties.items()):
+        for policy in policies:
+            sim = SimuladorLotes(rows, cols, n, seed=None if seed is None else seed + offset)
+            results[(difficulty, policy.name)] = summarize(sim.run(policy))
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description='Simulador por lotes de partidas de Emparejados')
+    parser.add_argument('-n', type=int, default=10000, help='tableros por dificultad')
+    parser.add_argument('--seed', type=int, default=None)
+    parser.add_argument('--memoria', type=int, default=6, help='cartas que recuerda la memoria limitada')
+    parser.add_argument('--dificultades', nargs='+', choices=list(DIFFICULTY_SETTINGS),
+                        default=list(DIFFICULTY_SETTINGS), help='dificultades a simular')
+    args = parser.parse_args()
+
+    policies = [JugadorAleatorio(), MemoriaPerfecta(), MemoriaLimitada(args.memoria)]
+    difficulties = {difficulty: DIFFICULTY_SETTINGS[difficulty] for difficulty in args.dificultades}
+    results = simulate_difficulties(policies, args.n, args.seed, difficulties)
+
+    print(f"{'Dificultad':<10} {'Politica':<18} {'media':>8} {'p10':>7} {'p50':>7} {'p90':>7} {'max':>6}")
+    for (difficulty, policy_name), stats in results.items():
+        print(f"{difficulty:<10} {policy_name:<18} {stats['media']:>8.2f} {stats['p10']:>7.1f} "
+              f"{stats['p50']:>7.1f} {stats['p90']:>7.1f} {stats['maximo']:>6}")
+
+if __name__ == "__main__":
+    main()